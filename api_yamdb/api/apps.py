@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import outbox, signals  # noqa: F401
+
+        # The outbox worker runs in processes serving requests, not in
+        # management commands, and picks up emails left from a restart.
+        request_started.connect(
+            outbox.start_worker,
+            dispatch_uid='api.outbox.start_worker',
+        )
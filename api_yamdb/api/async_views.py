@@ -0,0 +1,146 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views import View
+from django_filters.utils import translate_validation
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.filters import TitleFilterSet
+from api.renderers import ORJSONRenderer
+from api.search import get_backend
+from api.serializers import (
+    CommentSerializer,
+    ReviewSerializer,
+    TitleSerializer,
+)
+from reviews.models import Comment, Review, Title
+
+
+class AsyncReadView(View):
+    """
+    Read-only list and detail endpoint running on the event loop.
+
+    Queries go through the async ORM and serialization never touches the
+    database, so under ASGI a request waiting on the database or a slow
+    client does not hold a worker thread. Responses match the synchronous
+    endpoints, including page number pagination.
+    """
+
+    http_method_names = ('get', 'head', 'options')
+    serializer_class = None
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    async def check_parents(self):
+        """Return False when a parent object from the URL does not exist."""
+        return True
+
+    async def get(self, request, pk=None, **kwargs):
+        if not await self.check_parents():
+            return self.not_found()
+        try:
+            queryset = self.get_queryset()
+        except ValidationError as error:
+            return self.render(error.detail, status=400)
+        if pk is None:
+            return await self.list(request, queryset)
+        try:
+            obj = await queryset.aget(pk=pk)
+        except ObjectDoesNotExist:
+            return self.not_found()
+        return self.render(self.serializer_class(obj).data)
+
+    async def list(self, request, queryset):
+        size = api_settings.PAGE_SIZE
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 0
+        count = await queryset.acount()
+        start, end = (page - 1) * size, page * size
+        if page < 1 or start >= max(count, 1):
+            return self.not_found(PageNumberPagination.invalid_page_message)
+        objs = [obj async for obj in queryset[start:end]]
+        url = request.build_absolute_uri()
+        previous = None
+        if page == 2:
+            previous = remove_query_param(url, 'page')
+        elif page > 2:
+            previous = replace_query_param(url, 'page', page - 1)
+        return self.render(
+            {
+                'count': count,
+                'next': (
+                    replace_query_param(url, 'page', page + 1)
+                    if end < count
+                    else None
+                ),
+                'previous': previous,
+                'results': self.serializer_class(objs, many=True).data,
+            },
+        )
+
+    def render(self, data, status=200):
+        return HttpResponse(
+            ORJSONRenderer().render(data),
+            content_type='application/json',
+            status=status,
+        )
+
+    def not_found(self, detail=NotFound.default_detail):
+        return self.render({'detail': detail}, status=404)
+
+
+class AsyncTitleView(AsyncReadView):
+    serializer_class = TitleSerializer
+
+    def get_queryset(self):
+        queryset = (
+            Title.objects.select_related('category')
+            .prefetch_related('genre')
+            .order_by('id')
+        )
+        filterset = TitleFilterSet(self.request.GET, queryset=queryset)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        queryset = filterset.qs
+        query = self.request.GET.get(api_settings.SEARCH_PARAM, '').strip()
+        if query:
+            queryset = get_backend().search(
+                queryset,
+                ('name', 'description'),
+                query,
+            )
+        return queryset
+
+
+class AsyncReviewView(AsyncReadView):
+    serializer_class = ReviewSerializer
+
+    async def check_parents(self):
+        return await Title.objects.filter(
+            pk=self.kwargs['title_id'],
+        ).aexists()
+
+    def get_queryset(self):
+        return Review.objects.filter(
+            title_id=self.kwargs['title_id'],
+        ).select_related('author')
+
+
+class AsyncCommentView(AsyncReadView):
+    serializer_class = CommentSerializer
+
+    async def check_parents(self):
+        return await Review.objects.filter(
+            pk=self.kwargs['review_id'],
+            title_id=self.kwargs['title_id'],
+        ).aexists()
+
+    def get_queryset(self):
+        return Comment.objects.filter(
+            review_id=self.kwargs['review_id'],
+        ).select_related('author')
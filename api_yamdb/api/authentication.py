@@ -0,0 +1,164 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.cache import is_shared
+from api.replicas import follow_pin
+from reviews.models import User
+
+ROLE_CLAIM = 'role'
+SUPERUSER_CLAIM = 'is_superuser'
+
+
+def get_token(user):
+    """Return an access token carrying the claims permissions check."""
+    token = AccessToken.for_user(user)
+    token[ROLE_CLAIM] = user.role
+    token[SUPERUSER_CLAIM] = user.is_superuser
+    return token
+
+
+def claims_trusted():
+    """Whether revocations in the default cache reach every process."""
+    return is_shared('default')
+
+
+def changed_key(pk):
+    return f'auth:user:{pk}:changed'
+
+
+def invalidate_user(pk):
+    """
+    Stop trusting claims of tokens issued to the user until now.
+
+    The mark lives in the default cache as long as an access token, so
+    with a shared cache backend it reaches every process.
+    """
+    user_cache.discard(pk)
+    cache.set(
+        changed_key(pk),
+        time.time(),
+        int(jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()),
+    )
+
+
+class UserCache:
+    """Active users by id, kept for `AUTH_USER_CACHE_TTL` seconds."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+
+    def get(self, pk):
+        with self.lock:
+            expires, user = self.users.get(pk, (0, None))
+        if expires < time.monotonic():
+            user = User.objects.filter(pk=pk, is_active=True).first()
+            if user is None:
+                raise AuthenticationFailed(
+                    _('User not found'),
+                    code='user_not_found',
+                )
+            with self.lock:
+                self.users[pk] = (
+                    time.monotonic() + settings.AUTH_USER_CACHE_TTL,
+                    user,
+                )
+        # Requests may change their user, so they get their own copy.
+        return copy.copy(user)
+
+    def discard(self, pk):
+        with self.lock:
+            self.users.pop(pk, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    User authorized from token claims.
+
+    `pk`, `role` and `is_superuser` come from the token, any other
+    attribute loads the user through `user_cache`.
+    """
+
+    def __init__(self, pk, role, is_superuser):
+        super().__init__(lambda: user_cache.get(pk))
+        self.__dict__['claims'] = (pk, role, is_superuser)
+
+    @property
+    def pk(self):
+        return self.__dict__['claims'][0]
+
+    id = pk
+
+    @property
+    def role(self):
+        return self.__dict__['claims'][1]
+
+    @property
+    def is_superuser(self):
+        return self.__dict__['claims'][2]
+
+    is_authenticated = True
+    is_anonymous = False
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the user for permissions.
+
+    Tokens from `get_token` are trusted unless the user changed after
+    they were issued; other tokens load the user through `user_cache`.
+    Claims are only trusted with a shared default cache, otherwise a
+    demoted or deactivated user would keep the rights of the token in
+    every process but the one that changed it. Requests of users pinned
+    to the primary stop reading from replicas.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            follow_pin(result[0].pk)
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            pk = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'),
+            )
+        role = validated_token.get(ROLE_CLAIM)
+        if (
+            role is None
+            or not claims_trusted()
+            or self.is_stale(pk, validated_token)
+        ):
+            return user_cache.get(pk)
+        return ClaimsUser(
+            pk,
+            role,
+            validated_token.get(SUPERUSER_CLAIM, False),
+        )
+
+    def is_stale(self, pk, validated_token):
+        changed = cache.get(changed_key(pk))
+        return changed is not None and validated_token['iat'] <= changed
@@ -0,0 +1,68 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+HITS = 'catalog:hits'
+MISSES = 'catalog:misses'
+
+# Backends whose entries do not reach other processes.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def is_shared(alias=None):
+    """Whether the cache, the catalog one by default, spans processes."""
+    backend = settings.CACHES[alias or settings.CATALOG_CACHE_ALIAS]
+    return backend['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def version_key(namespace):
+    return f'catalog:{namespace}:version'
+
+
+def get_version(namespace):
+    return get_cache().get_or_set(version_key(namespace), time.time_ns, None)
+
+
+def invalidate(*namespaces):
+    """Make every cached response of the given namespaces stale.
+
+    Versions are nanosecond timestamps, so they double as the time of
+    the last change.
+    """
+    cache = get_cache()
+    version = time.time_ns()
+    cache.set_many(
+        {version_key(namespace): version for namespace in namespaces},
+        None,
+    )
+
+
+def make_key(namespace, request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    source = f'{request.accepted_renderer.format}:{request.path}?{query}'
+    digest = hashlib.md5(source.encode()).hexdigest()
+    return f'catalog:{namespace}:{get_version(namespace)}:{digest}'
+
+
+def count(key):
+    cache = get_cache()
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def get_stats():
+    cache = get_cache()
+    return {'hits': cache.get(HITS, 0), 'misses': cache.get(MISSES, 0)}
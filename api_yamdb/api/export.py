@@ -0,0 +1,140 @@
+import csv
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from reviews.management.commands.importcsv import DATA
+from reviews.models import Review, Title, TitleGenre
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+# Columns of the files in `static/data`, as read by `importcsv`.
+COLUMNS = {
+    'category.csv': ('id', 'name', 'slug'),
+    'genre.csv': ('id', 'name', 'slug'),
+    'users.csv': (
+        'id',
+        'username',
+        'email',
+        'role',
+        'bio',
+        'first_name',
+        'last_name',
+    ),
+    'title.csv': ('id', 'name', 'year', 'category_id'),
+    'title_genre.csv': ('id', 'title_id', 'genre_id'),
+    'review.csv': ('id', 'title_id', 'text', 'author_id', 'score', 'pub_date'),
+    'comments.csv': ('id', 'review_id', 'text', 'author_id', 'pub_date'),
+}
+
+TABLES = {filename: model for filename, model, _ in DATA}
+
+# Keys of reviews in `titles.ndjson` and the lookups they are read from.
+REVIEW_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'score': 'score',
+    'text': 'text',
+    'pub_date': 'pub_date',
+}
+
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return DjangoJSONEncoder().default(value)
+    return value
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """Join small strings into blocks of about `size` characters."""
+    block, length = [], 0
+    for chunk in chunks:
+        block.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(block)
+            block, length = [], 0
+    if block:
+        yield ''.join(block)
+
+
+class Line:
+    """File-like object whose `write` returns the written line."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(filename, chunk_size=CHUNK_SIZE):
+    """Yield lines of a `static/data` file built from the database."""
+    columns = COLUMNS[filename]
+    writer = csv.writer(Line(), lineterminator='\n')
+    yield writer.writerow(columns)
+    rows = (
+        TABLES[filename]
+        .objects.order_by('pk')
+        .values_list(*columns)
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield writer.writerow([format_value(value) for value in row])
+
+
+class GroupCursor:
+    """Rows sorted by their first column, taken group by group."""
+
+    def __init__(self, rows):
+        self.groups = groupby(rows, key=itemgetter(0))
+        self.current = next(self.groups, None)
+
+    def pop(self, key):
+        while self.current is not None and self.current[0] < key:
+            self.current = next(self.groups, None)
+        if self.current is None or self.current[0] != key:
+            return []
+        rows = list(self.current[1])
+        self.current = next(self.groups, None)
+        return rows
+
+
+def iter_titles(chunk_size=CHUNK_SIZE):
+    """
+    Yield titles with genres, rating and reviews as JSON lines.
+
+    Titles, genres and reviews are read by three cursors sorted by title
+    id and merged, so memory use does not depend on the catalog size.
+    """
+    titles = (
+        Title.objects.select_related('category')
+        .order_by('pk')
+        .iterator(chunk_size=chunk_size)
+    )
+    genres = GroupCursor(
+        TitleGenre.objects.order_by('title_id', 'genre_id')
+        .values_list('title_id', 'genre__slug')
+        .iterator(chunk_size=chunk_size),
+    )
+    reviews = GroupCursor(
+        Review.objects.order_by('title_id', 'pk')
+        .values_list('title_id', *REVIEW_FIELDS.values())
+        .iterator(chunk_size=chunk_size),
+    )
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for title in titles:
+        data = {
+            'id': title.pk,
+            'name': title.name,
+            'year': title.year,
+            'description': title.description,
+            'category': title.category.slug if title.category else None,
+            'genre': [slug for _, slug in genres.pop(title.pk)],
+            'rating': title.rating,
+            'reviews': [
+                dict(zip(REVIEW_FIELDS, row[1:]))
+                for row in reviews.pop(title.pk)
+            ],
+        }
+        yield encoder.encode(data) + '\n'
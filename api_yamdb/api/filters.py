@@ -1,6 +1,13 @@
 import django_filters
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast, Mod
+from rest_framework import filters
 
-from reviews.models import Title
+from api.search import get_backend
+from reviews.models import Title, TitleGenre
+
+FACETS = ('genre', 'category', 'year')
+YEAR_BUCKET = 10
 
 
 class TitleFilterSet(django_filters.rest_framework.FilterSet):
@@ -10,3 +17,69 @@ class TitleFilterSet(django_filters.rest_framework.FilterSet):
     class Meta:
         model = Title
         fields = ('name', 'year', 'category', 'genre')
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """Indexed search by `search_fields` with prefix matching and ranking."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        fields = getattr(view, 'search_fields', None)
+        if not query or not fields:
+            return queryset
+        return get_backend().search(queryset, fields, query)
+
+
+def get_facet_query(queryset, name, value):
+    return (
+        queryset.order_by()
+        .values(value=Cast(value, CharField()))
+        .annotate(facet=Value(name, CharField()), count=Count('*'))
+        .values_list('facet', 'value', 'count')
+    )
+
+
+def get_facets(queryset, names=FACETS):
+    """
+    Count titles of `queryset` per genre, category and year bucket.
+
+    Every facet is a grouped subquery over the filtered titles, and they
+    are combined with UNION ALL into a single query.
+    """
+    titles = queryset.order_by().values('pk')
+    own = Title.objects.filter(pk__in=titles)
+    queries = {
+        'genre': get_facet_query(
+            TitleGenre.objects.filter(title__in=titles),
+            'genre',
+            F('genre__slug'),
+        ),
+        'category': get_facet_query(
+            own.filter(category__isnull=False),
+            'category',
+            F('category__slug'),
+        ),
+        'year': get_facet_query(
+            own,
+            'year',
+            F('year') - Mod('year', YEAR_BUCKET),
+        ),
+    }
+    first, *rest = [queries[name] for name in names]
+    rows = {name: [] for name in names}
+    for name, value, count in first.union(*rest, all=True):
+        rows[name].append((value, count))
+    facets = {}
+    for name, counts in rows.items():
+        if name == 'year':
+            facets[name] = {
+                f'{start}-{start + YEAR_BUCKET - 1}': count
+                for start, count in sorted(
+                    (int(float(value)), count) for value, count in counts
+                )
+            }
+        else:
+            facets[name] = dict(
+                sorted(counts, key=lambda item: (-item[1], item[0])),
+            )
+    return facets
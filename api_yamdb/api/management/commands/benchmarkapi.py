@@ -0,0 +1,389 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from api.authentication import get_token
+from api.metrics import percentile
+from reviews.models import ADMIN, Comment, Genre, Review, Title, User
+
+BENCH_USERNAME = 'bench_admin'
+
+# Every route of `api.urls`, weighted like a read-heavy client mix.
+# `{...}` placeholders are filled from the seeded data for each request.
+WORKLOAD = (
+    {'name': 'categories', 'url': '/api/v1/categories/', 'weight': 5},
+    {'name': 'genres', 'url': '/api/v1/genres/', 'weight': 5},
+    {
+        'name': 'categories (anonymous)',
+        'url': '/api/v1/categories/',
+        'weight': 5,
+        'auth': False,
+    },
+    {'name': 'titles', 'url': '/api/v1/titles/', 'weight': 15},
+    {
+        'name': 'titles (anonymous)',
+        'url': '/api/v1/titles/?page={page}',
+        'weight': 10,
+        'auth': False,
+    },
+    {
+        'name': 'titles?genre',
+        'url': '/api/v1/titles/?genre={genre_slug}',
+        'weight': 5,
+    },
+    {'name': 'title', 'url': '/api/v1/titles/{title_id}/', 'weight': 10},
+    {
+        'name': 'reviews',
+        'url': '/api/v1/titles/{title_id}/reviews/',
+        'weight': 10,
+    },
+    {
+        'name': 'review',
+        'url': '/api/v1/titles/{title_id}/reviews/{review_id}/',
+        'weight': 5,
+    },
+    {
+        'name': 'comments',
+        'url': '/api/v1/titles/{title_id}/reviews/{review_id}/comments/',
+        'weight': 8,
+    },
+    {
+        'name': 'comment',
+        'url': (
+            '/api/v1/titles/{title_id}/reviews/{review_id}/comments/'
+            '{comment_id}/'
+        ),
+        'weight': 4,
+    },
+    {
+        'name': 'comment create',
+        'method': 'POST',
+        'url': '/api/v1/titles/{title_id}/reviews/{review_id}/comments/',
+        'data': {'text': 'Комментарий нагрузочного теста'},
+        'weight': 3,
+    },
+    {
+        'name': 'review update',
+        'method': 'PATCH',
+        'url': '/api/v1/titles/{own_title_id}/reviews/{own_review_id}/',
+        'data': {'score': 5},
+        'weight': 2,
+    },
+    {'name': 'users', 'url': '/api/v1/users/', 'weight': 2},
+    {'name': 'user', 'url': '/api/v1/users/{username}/', 'weight': 1},
+    {'name': 'users/me', 'url': '/api/v1/users/me/', 'weight': 2},
+    {'name': 'cache stats', 'url': '/api/v1/cache/stats/', 'weight': 1},
+    {
+        'name': 'auth/signup',
+        'method': 'POST',
+        'url': '/api/v1/auth/signup/',
+        'data': {'username': 'bench_{n}', 'email': 'bench_{n}@yamdb.fake'},
+        'weight': 1,
+        'auth': False,
+    },
+    {
+        'name': 'auth/token',
+        'method': 'POST',
+        'url': '/api/v1/auth/token/',
+        'data': {'username': BENCH_USERNAME, 'confirmation_code': 'wrong'},
+        'weight': 1,
+        'auth': False,
+    },
+)
+
+
+def fill(value, context):
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    return value
+
+
+class Command(BaseCommand):
+    """
+    Replays a mixed API workload and reports latency per endpoint.
+
+    Requests go through the Django test client in this process, or over
+    HTTP to a running server with `--url`, which must use the same
+    database. The workload is a JSON lines file with `name`, `url`,
+    optional `method`, `data`, `weight` and `auth` keys; by default
+    every route of the API is covered. Run it on a scratch database.
+
+    Usage:
+    ```
+    manage.py benchmarkapi [--seed] [--requests N] [--concurrency N]
+        [--url URL] [--workload FILE] [--json FILE] [--baseline FILE]
+    ```
+    """
+
+    help = 'Replays a mixed API workload and reports latency per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Fill the database with `seeddata` first.',
+        )
+        for name in ('users', 'titles', 'reviews', 'comments'):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                help=f'`seeddata --{name}` value used with --seed.',
+            )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Requests to replay.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Clients sending requests in parallel.',
+        )
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server, e.g. http://127.0.0.1:8000',
+        )
+        parser.add_argument('--workload', help='JSON lines workload file.')
+        parser.add_argument('--json', help='Write results to this file.')
+        parser.add_argument(
+            '--baseline',
+            help='Compare with results written earlier by --json.',
+        )
+        parser.add_argument(
+            '--random-seed',
+            type=int,
+            default=0,
+            help='Seed of the request mix.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('Requests and concurrency must be positive.')
+        if options['seed']:
+            call_command(
+                'seeddata',
+                silent=True,
+                **{
+                    name: options[name]
+                    for name in ('users', 'titles', 'reviews', 'comments')
+                    if options[name] is not None
+                },
+            )
+        workload = self.load_workload(options['workload'])
+        self.contexts = self.get_contexts()
+        self.token = str(get_token(self.user))
+        self.counter = iter(range(10**9))
+        self.lock = threading.Lock()
+        rnd = random.Random(options['random_seed'])
+        plan = rnd.choices(
+            workload,
+            weights=[item.get('weight', 1) for item in workload],
+            k=options['requests'],
+        )
+        self.samples = defaultdict(list)
+        send = self.send_http if options['url'] else self.send_local
+        self.base_url = (options['url'] or '').rstrip('/')
+        self.local = threading.local()
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            THROTTLE_ENABLED=False,
+        ):
+            started = time.perf_counter()
+            if options['concurrency'] == 1:
+                for item in plan:
+                    self.run(send, item, rnd)
+            else:
+                with ThreadPoolExecutor(options['concurrency']) as executor:
+                    list(
+                        executor.map(
+                            lambda item: self.run(send, item, rnd),
+                            plan,
+                        ),
+                    )
+            elapsed = time.perf_counter() - started
+        results = self.summarize(elapsed, options)
+        self.report(results)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                self.compare(results, json.load(f))
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    def load_workload(self, path):
+        if path is None:
+            return WORKLOAD
+        with open(path, encoding='utf-8') as f:
+            workload = [json.loads(line) for line in f if line.strip()]
+        if not workload:
+            raise CommandError('Workload file is empty.')
+        return workload
+
+    def get_contexts(self):
+        """Collect placeholder values for URLs from existing rows."""
+        nested = list(
+            Comment.objects.values_list(
+                'review__title_id',
+                'review_id',
+                'id',
+            ).order_by('?')[:1000],
+        )
+        if not nested or not Genre.objects.exists():
+            raise CommandError('No data to benchmark, use --seed.')
+        self.user, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@yamdb.fake', 'role': ADMIN},
+        )
+        own_review = Review.objects.filter(author=self.user).first()
+        if own_review is None:
+            own_review = Review.objects.create(
+                title=Title.objects.exclude(reviews__author=self.user)[0],
+                author=self.user,
+                text='Отзыв нагрузочного теста',
+                score=5,
+            )
+        pages = max(1, Title.objects.count() // 20)
+        genres = list(Genre.objects.values_list('slug', flat=True)[:100])
+        return [
+            {
+                'title_id': title_id,
+                'review_id': review_id,
+                'comment_id': comment_id,
+                'own_title_id': own_review.title_id,
+                'own_review_id': own_review.pk,
+                'genre_slug': genres[num % len(genres)],
+                'page': num % pages + 1,
+                'username': BENCH_USERNAME,
+            }
+            for num, (title_id, review_id, comment_id) in enumerate(nested)
+        ]
+
+    def run(self, send, item, rnd):
+        with self.lock:
+            context = {
+                **rnd.choice(self.contexts),
+                'n': next(self.counter),
+            }
+        method = item.get('method', 'GET')
+        url = fill(item['url'], context)
+        data = fill(item.get('data'), context)
+        started = time.perf_counter()
+        status, queries = send(method, url, data, item.get('auth', True))
+        latency = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.samples[item['name']].append((latency, status, queries))
+
+    def send_local(self, method, url, data, auth):
+        if not hasattr(self.local, 'client'):
+            self.local.client = Client(SERVER_NAME='localhost')
+        headers = (
+            {'HTTP_AUTHORIZATION': f'Bearer {self.token}'} if auth else {}
+        )
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = self.local.client.generic(
+                method,
+                url,
+                json.dumps(data) if data is not None else '',
+                content_type='application/json',
+                **headers,
+            )
+        return response.status_code, len(queries)
+
+    def send_http(self, method, url, data, auth):
+        request = urllib.request.Request(
+            self.base_url + url,
+            data=json.dumps(data).encode() if data is not None else None,
+            method=method,
+            headers={'Content-Type': 'application/json'},
+        )
+        if auth:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+    def summarize(self, elapsed, options):
+        endpoints = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = [sample[0] for sample in samples]
+            queries = [
+                sample[2] for sample in samples if sample[2] is not None
+            ]
+            statuses = defaultdict(int)
+            for sample in samples:
+                statuses[str(sample[1])] += 1
+            endpoints[name] = {
+                'requests': len(samples),
+                'rps': len(samples) / elapsed,
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'queries': sum(queries) / len(queries) if queries else None,
+                'statuses': dict(statuses),
+            }
+        return {
+            'mode': 'http' if options['url'] else 'local',
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'seconds': elapsed,
+            'rps': options['requests'] / elapsed,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<24} {"reqs":>5} {"rps":>8} {"p50":>8} '
+            f'{"p95":>8} {"p99":>8} {"queries":>7}  statuses',
+        )
+        for name, row in results['endpoints'].items():
+            queries = (
+                f'{row["queries"]:>7.1f}'
+                if row['queries'] is not None
+                else (f'{"-":>7}')
+            )
+            self.stdout.write(
+                f'{name:<24} {row["requests"]:>5} {row["rps"]:>8.1f} '
+                f'{row["p50"]:>6.2f}ms {row["p95"]:>6.2f}ms '
+                f'{row["p99"]:>6.2f}ms {queries}  '
+                + ' '.join(
+                    f'{code}x{count}'
+                    for code, count in sorted(row['statuses'].items())
+                ),
+            )
+        self.stdout.write(
+            f'{results["requests"]} requests in {results["seconds"]:.2f}s, '
+            f'{results["rps"]:.1f} requests/s',
+        )
+
+    def compare(self, results, baseline):
+        self.stdout.write('\np50 change against baseline:')
+        for name, row in results['endpoints'].items():
+            old = baseline['endpoints'].get(name)
+            if old:
+                change = (row['p50'] - old['p50']) / old['p50'] * 100
+                self.stdout.write(f'{name:<24} {change:>+7.1f}%')
+        change = (results['rps'] - baseline['rps']) / baseline['rps'] * 100
+        self.stdout.write(f'{"requests/s":<24} {change:>+7.1f}%')
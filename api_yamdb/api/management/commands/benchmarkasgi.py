@@ -0,0 +1,154 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+
+from api.metrics import percentile
+from reviews.models import Comment
+
+# Read endpoints with both a synchronous and an async implementation.
+ROUTES = (
+    '/api/v1/{prefix}titles/',
+    '/api/v1/{prefix}titles/{title_id}/',
+    '/api/v1/{prefix}titles/{title_id}/reviews/',
+    '/api/v1/{prefix}titles/{title_id}/reviews/{review_id}/comments/',
+)
+
+
+class Command(BaseCommand):
+    """
+    Compares WSGI and ASGI throughput of the read endpoints.
+
+    The same requests are sent three ways in this process: synchronous
+    views through the WSGI handler by a pool of `--threads` workers,
+    then synchronous and async views through the ASGI handler by
+    `--concurrency` tasks on one event loop. To measure real servers,
+    run `benchmarkapi --url` against gunicorn and uvicorn instead.
+
+    Usage:
+    ```
+    manage.py benchmarkasgi [--seed] [--requests N] [--threads N]
+        [--concurrency N]
+    ```
+    """
+
+    help = 'Compares WSGI and ASGI throughput of the read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Fill the database with `seeddata` first.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Requests per mode.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Worker threads of the WSGI mode.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Requests in flight in the ASGI modes.',
+        )
+
+    def handle(self, *args, **options):
+        if any(
+            options[name] < 1
+            for name in ('requests', 'threads', 'concurrency')
+        ):
+            raise CommandError(
+                'Requests, threads and concurrency must be positive.',
+            )
+        if options['seed']:
+            call_command('seeddata', silent=True)
+        nested = list(
+            Comment.objects.values_list(
+                'review__title_id',
+                'review_id',
+            ).order_by('?')[:100],
+        )
+        if not nested:
+            raise CommandError('No data to benchmark, use --seed.')
+        rnd = random.Random(0)
+        plan = []
+        for num in range(options['requests']):
+            title_id, review_id = rnd.choice(nested)
+            plan.append(
+                (ROUTES[num % len(ROUTES)], title_id, review_id),
+            )
+        self.stdout.write(
+            f'{"mode":<12} {"rps":>8} {"p50":>8} {"p95":>8}  statuses',
+        )
+        for name, prefix, run in (
+            ('wsgi', '', self.run_wsgi),
+            ('asgi', '', self.run_asgi),
+            ('asgi async', 'async/', self.run_asgi),
+        ):
+            urls = [
+                route.format(
+                    prefix=prefix,
+                    title_id=title_id,
+                    review_id=review_id,
+                )
+                for route, title_id, review_id in plan
+            ]
+            started = time.perf_counter()
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                samples = run(urls, options)
+            self.report(name, samples, time.perf_counter() - started)
+
+    def run_wsgi(self, urls, options):
+        client = Client()
+
+        def send(url):
+            started = time.perf_counter()
+            response = client.get(url)
+            return time.perf_counter() - started, response.status_code
+
+        with ThreadPoolExecutor(options['threads']) as executor:
+            return list(executor.map(send, urls))
+
+    def run_asgi(self, urls, options):
+        async def send_all():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def send(url):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    elapsed = time.perf_counter() - started
+                    return elapsed, response.status_code
+
+            return await asyncio.gather(*(send(url) for url in urls))
+
+        return asyncio.run(send_all())
+
+    def report(self, name, samples, elapsed):
+        latencies = [sample[0] * 1000 for sample in samples]
+        statuses = {}
+        for _, code in samples:
+            statuses[code] = statuses.get(code, 0) + 1
+        self.stdout.write(
+            f'{name:<12} {len(samples) / elapsed:>8.1f} '
+            f'{percentile(latencies, 50):>6.2f}ms '
+            f'{percentile(latencies, 95):>6.2f}ms  '
+            + ' '.join(
+                f'{code}x{count}' for code, count in sorted(statuses.items())
+            ),
+        )
@@ -0,0 +1,231 @@
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.test import Client, override_settings
+
+from api.authentication import get_token
+from api.metrics import percentile
+from reviews.models import Title, User
+
+PROFILES = ('stock', 'tuned')
+
+
+class Command(BaseCommand):
+    """
+    Measures mixed read and write throughput of the SQLite setup.
+
+    `--threads` clients send title list, review list and review create
+    requests through the WSGI handler in this process, `--writes`
+    percent of them writes. Connections are closed after each request
+    the way the WSGI handler does, so `CONN_MAX_AGE` applies. The
+    `stock` profile is the default Django SQLite setup, the `tuned` one
+    is `DATABASES` from settings. Every run posts reviews by new users,
+    so run it on a scratch database.
+
+    Usage:
+    ```
+    manage.py benchmarkconcurrency [--seed] [--requests N] [--threads N]
+        [--writes PERCENT] [--profile {stock,tuned,both}]
+    ```
+    """
+
+    help = 'Measures mixed read and write throughput of the SQLite setup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Fill the database with `seeddata` defaults first.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per profile.',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Clients sending requests in parallel.',
+        )
+        parser.add_argument(
+            '--writes',
+            type=int,
+            default=20,
+            help='Percent of requests that post a review.',
+        )
+        parser.add_argument(
+            '--profile',
+            choices=(*PROFILES, 'both'),
+            default='both',
+            help='Database setup to measure.',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('Requests and threads must be positive.')
+        if not 0 <= options['writes'] <= 100:
+            raise CommandError('Writes must be a percentage.')
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite.')
+        if options['seed']:
+            call_command('seeddata', silent=True)
+        self.title_ids = list(Title.objects.values_list('pk', flat=True))
+        if not self.title_ids:
+            raise CommandError('No data to benchmark, use --seed.')
+        profiles = (
+            PROFILES if options['profile'] == 'both' else (options['profile'],)
+        )
+        self.stdout.write(
+            f'{"profile":<8} {"rps":>8} {"read p50":>10} {"read p95":>10} '
+            f'{"write p50":>10} {"write p95":>10}  statuses',
+        )
+        # Failed requests are counted in the report instead of logged.
+        logger = logging.getLogger('django.request')
+        level = logger.level
+        logger.setLevel(logging.CRITICAL)
+        try:
+            for name in profiles:
+                plan = self.get_plan(options)
+                with self.profile(name), override_settings(
+                    THROTTLE_ENABLED=False,
+                ):
+                    started = time.perf_counter()
+                    samples = self.run(plan, options['threads'])
+                    elapsed = time.perf_counter() - started
+                self.report(name, samples, elapsed)
+        finally:
+            logger.setLevel(level)
+
+    def get_plan(self, options):
+        """Build requests, writes post reviews by users created for it."""
+        rnd = random.Random(0)
+        writes = round(options['requests'] * options['writes'] / 100)
+        authors = User.objects.bulk_create(
+            User(
+                username=f'bench_{uuid.uuid4().hex[:12]}',
+                email=f'bench_{uuid.uuid4().hex[:12]}@yamdb.fake',
+            )
+            for _ in range(math.ceil(writes / len(self.title_ids)))
+        )
+        tokens = [str(get_token(author)) for author in authors]
+        pages = max(1, len(self.title_ids) // 20)
+        plan = [
+            (
+                'POST',
+                f'/api/v1/titles/{self.title_ids[num % len(self.title_ids)]}'
+                '/reviews/',
+                {'text': 'Отзыв нагрузочного теста', 'score': 5},
+                tokens[num // len(self.title_ids)],
+            )
+            for num in range(writes)
+        ]
+        for num in range(options['requests'] - writes):
+            if num % 2:
+                url = f'/api/v1/titles/?page={rnd.randint(1, pages)}'
+            else:
+                url = f'/api/v1/titles/{rnd.choice(self.title_ids)}/reviews/'
+            plan.append(('GET', url, None, None))
+        rnd.shuffle(plan)
+        return plan
+
+    @contextmanager
+    def profile(self, name):
+        """Switch new connections to the settings of the profile."""
+        tuned = connections.settings[DEFAULT_DB_ALIAS]
+        connection = connections[DEFAULT_DB_ALIAS]
+        if name == 'stock':
+            connections.settings[DEFAULT_DB_ALIAS] = {
+                **tuned,
+                'ENGINE': 'django.db.backends.sqlite3',
+                'CONN_MAX_AGE': 0,
+                'CONN_HEALTH_CHECKS': False,
+                'OPTIONS': {},
+            }
+            # The journal mode is stored in the file, so it is reset here
+            # while no other connection is open.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+        try:
+            yield
+        finally:
+            connections.settings[DEFAULT_DB_ALIAS] = tuned
+            connection.close()
+
+    def run(self, plan, threads):
+        def send_all(requests):
+            client = Client(SERVER_NAME='localhost')
+            client.raise_request_exception = False
+            samples = []
+            try:
+                for method, url, data, token in requests:
+                    headers = (
+                        {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+                        if token
+                        else {}
+                    )
+                    started = time.perf_counter()
+                    response = client.generic(
+                        method,
+                        url,
+                        json.dumps(data) if data is not None else '',
+                        content_type='application/json',
+                        **headers,
+                    )
+                    close_old_connections()
+                    samples.append(
+                        (
+                            method,
+                            time.perf_counter() - started,
+                            response.status_code,
+                        ),
+                    )
+            finally:
+                connections.close_all()
+            return samples
+
+        with ThreadPoolExecutor(threads) as executor:
+            return [
+                sample
+                for samples in executor.map(
+                    send_all,
+                    [plan[num::threads] for num in range(threads)],
+                )
+                for sample in samples
+            ]
+
+    def report(self, name, samples, elapsed):
+        columns = []
+        for method in ('GET', 'POST'):
+            latencies = [
+                sample[1] * 1000 for sample in samples if sample[0] == method
+            ]
+            for q in (50, 95):
+                columns.append(
+                    (
+                        f'{percentile(latencies, q):>8.2f}ms'
+                        if latencies
+                        else f'{"-":>10}'
+                    ),
+                )
+        statuses = {}
+        for _, _, code in samples:
+            statuses[code] = statuses.get(code, 0) + 1
+        self.stdout.write(
+            f'{name:<8} {len(samples) / elapsed:>8.1f} '
+            + ' '.join(columns)
+            + '  '
+            + ' '.join(
+                f'{code}x{count}' for code, count in sorted(statuses.items())
+            ),
+        )
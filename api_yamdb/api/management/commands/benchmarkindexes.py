@@ -0,0 +1,174 @@
+import statistics
+import time
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+from django.urls import reverse
+
+from api.authentication import get_token
+from reviews.models import ADMIN, Review, Title, User
+
+
+class Command(BaseCommand):
+    """
+    Compares API query plans and timings without and with model indexes.
+
+    Every index declared in `Meta.indexes` of the reviews models is
+    dropped, each endpoint is measured, then the indexes are restored
+    and the endpoints are measured again. Run it on a scratch database.
+
+    Usage:
+    ```
+    manage.py benchmarkindexes [--seed] [--repeat N] [--plans]
+    ```
+    """
+
+    help = 'Compares API query plans and timings without and with indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Fill the database with `seeddata` defaults first.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Requests per endpoint, the median time is reported.',
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Print query plans of every endpoint.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('Repeat must be a positive integer.')
+        if options['seed']:
+            call_command('seeddata', silent=True)
+        user = (
+            User.objects.filter(Q(role=ADMIN) | Q(is_superuser=True)).first()
+            or User.objects.first()
+        )
+        if user is None or not Review.objects.exists():
+            raise CommandError('No data to benchmark, run `seeddata` first.')
+        self.client = Client(
+            SERVER_NAME='localhost',
+            HTTP_AUTHORIZATION=f'Bearer {get_token(user)}',
+        )
+        endpoints = self.get_endpoints()
+        if not user.is_admin:
+            del endpoints['users']
+        indexes = [
+            (model, index)
+            for model in apps.get_app_config('reviews').get_models()
+            for index in model._meta.indexes
+        ]
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        try:
+            before = self.measure(endpoints, options['repeat'])
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+        after = self.measure(endpoints, options['repeat'])
+        self.report(endpoints, before, after, options['plans'])
+
+    def report(self, endpoints, before, after, plans):
+        self.stdout.write(
+            f'{"endpoint":<48} {"queries":>7} {"before":>9} {"after":>9}',
+        )
+        for name in endpoints:
+            self.stdout.write(
+                f'{name:<48} {after[name]["queries"]:>7} '
+                f'{before[name]["time"]:>7.2f}ms '
+                f'{after[name]["time"]:>7.2f}ms',
+            )
+        if plans:
+            for name in endpoints:
+                self.stdout.write(f'\n{name}')
+                for label, result in (('before', before), ('after', after)):
+                    self.stdout.write(f'  {label}:')
+                    for plan in result[name]['plans']:
+                        self.stdout.write(f'    {plan}')
+
+    def get_endpoints(self):
+        """Build one URL per API access path from existing rows."""
+        review = (
+            Review.objects.order_by('-title__rating_count', 'pk')
+            .select_related('title')
+            .first()
+        )
+        title = review.title
+        sample = Title.objects.filter(category__isnull=False).first() or title
+        genre = sample.genre.first()
+        endpoints = {
+            'categories': reverse('api:category-list'),
+            'genres': reverse('api:genre-list'),
+            'titles': reverse('api:title-list'),
+            'titles?year': f'{reverse("api:title-list")}?year={sample.year}',
+            'titles?name': f'{reverse("api:title-list")}?name={sample.name}',
+            'title': reverse('api:title-detail', args=(title.pk,)),
+            'reviews': reverse('api:reviews-list', args=(title.pk,)),
+            'reviews?pagination=cursor': (
+                f'{reverse("api:reviews-list", args=(title.pk,))}'
+                '?pagination=cursor'
+            ),
+            'review': reverse(
+                'api:reviews-detail',
+                args=(title.pk, review.pk),
+            ),
+            'comments': reverse(
+                'api:comments-list',
+                args=(title.pk, review.pk),
+            ),
+            'users': reverse('api:users-list'),
+        }
+        if sample.category is not None:
+            endpoints['titles?category'] = (
+                f'{reverse("api:title-list")}?category={sample.category.slug}'
+            )
+        if genre is not None:
+            endpoints['titles?genre'] = (
+                f'{reverse("api:title-list")}?genre={genre.slug}'
+            )
+        return endpoints
+
+    def measure(self, endpoints, repeat):
+        results = {}
+        for name, url in endpoints.items():
+            queries = []
+
+            def record(execute, sql, params, many, context):
+                queries.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(record):
+                self.client.get(url)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                self.client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {
+                'queries': len(queries),
+                'time': statistics.median(timings),
+                'plans': [self.explain(*query) for query in queries],
+            }
+        return results
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}',
+                params,
+            )
+            return ' / '.join(str(row[-1]) for row in cursor.fetchall())
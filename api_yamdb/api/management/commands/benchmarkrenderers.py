@@ -0,0 +1,101 @@
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from api import renderers
+from api.serializers import ReviewSerializer, TitleSerializer
+from reviews.models import Title
+
+
+class Command(BaseCommand):
+    """
+    Compares render times of title and review pages across renderers.
+
+    Pages are serialized once, then each renderer turns them into bytes
+    `--repeat` times; the median time and the output size are reported.
+    MessagePack is measured when the `msgpack` package is installed.
+
+    Usage:
+    ```
+    manage.py benchmarkrenderers [--seed] [--repeat N]
+    ```
+    """
+
+    help = 'Compares render times of title and review pages across renderers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Fill the database with `seeddata` defaults first.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Renders per page and renderer.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('Repeat must be a positive integer.')
+        if options['seed']:
+            call_command('seeddata', silent=True)
+        pages = self.get_pages()
+        if pages is None:
+            raise CommandError('No data to benchmark, use --seed.')
+        candidates = {
+            'drf json': JSONRenderer(),
+            'orjson': renderers.ORJSONRenderer(),
+        }
+        if renderers.msgpack is not None:
+            candidates['msgpack'] = renderers.MessagePackRenderer()
+        self.stdout.write(
+            f'{"page":<10} {"renderer":<10} {"median":>10} {"bytes":>8}',
+        )
+        for page, data in pages.items():
+            for name, renderer in candidates.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    content = renderer.render(data)
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f'{page:<10} {name:<10} '
+                    f'{statistics.median(timings) * 10**6:>8.1f}us '
+                    f'{len(content):>8}',
+                )
+
+    def get_pages(self):
+        """Serialize a title page and the largest review page."""
+        size = api_settings.PAGE_SIZE
+        titles = Title.objects.select_related('category').prefetch_related(
+            'genre',
+        )[:size]
+        title = (
+            Title.objects.annotate(reviews_count=Count('reviews'))
+            .order_by('-reviews_count')
+            .first()
+        )
+        if title is None:
+            return None
+        reviews = title.reviews.select_related('author')[:size]
+        return {
+            'titles': self.paginate(TitleSerializer(titles, many=True).data),
+            'reviews': self.paginate(
+                ReviewSerializer(reviews, many=True).data,
+            ),
+        }
+
+    def paginate(self, results):
+        return {
+            'count': len(results),
+            'next': None,
+            'previous': None,
+            'results': results,
+        }
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.search import get_backend
+
+
+class Command(BaseCommand):
+    """
+    Recreates full-text search indexes and refills them from the tables.
+
+    Needed after migrations that rebuild an indexed table, since the
+    triggers keeping the index in sync are dropped together with it.
+
+    Usage:
+    ```
+    manage.py rebuildsearch
+    ```
+    """
+
+    help = 'Recreates full-text search indexes'
+
+    def handle(self, *args, **options):
+        get_backend().install(connection)
+        self.stdout.write('Search indexes rebuilt.')
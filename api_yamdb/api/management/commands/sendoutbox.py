@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.outbox import deliver
+
+
+class Command(BaseCommand):
+    """
+    Sends due emails from the outbox.
+
+    Web processes send emails themselves unless `EMAIL_OUTBOX_WORKER`
+    is off; then run it with `--loop` as a dedicated sender process.
+
+    Usage:
+    ```
+    manage.py sendoutbox [--loop]
+    ```
+    """
+
+    help = 'Sends due emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = deliver()
+            if delivered:
+                self.stdout.write(f'Delivered {delivered} emails.')
+            if not options['loop']:
+                break
+            time.sleep(settings.EMAIL_OUTBOX_POLL_INTERVAL)
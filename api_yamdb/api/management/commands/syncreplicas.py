@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """
+    Copies the SQLite primary database into every SQLite replica.
+
+    Stands in for replication when replicas are local files, see the
+    `REPLICA_DATABASES` setting. Reads of the replicas stay as stale as
+    the last copy.
+
+    Usage:
+    ```
+    manage.py syncreplicas
+    ```
+    """
+
+    help = 'Copies the SQLite primary database into every SQLite replica'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas are configured.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = [connections[alias] for alias in settings.DATABASE_REPLICAS]
+        if any(
+            connection.vendor != 'sqlite'
+            for connection in (primary, *replicas)
+        ):
+            raise CommandError('Only SQLite databases can be copied.')
+        primary.ensure_connection()
+        for replica in replicas:
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
+            self.stdout.write(f'Copied the primary into {replica.alias}.')
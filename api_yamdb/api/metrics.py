@@ -0,0 +1,126 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+current = ContextVar('request_metrics', default=None)
+
+
+def percentile(values, q):
+    """Return the nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class RequestMetrics:
+    """Timings of a single request, in milliseconds."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.view = 0.0
+        self.total = 0.0
+        self.view_started = None
+        self.timing = set()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += (time.perf_counter() - started) * 1000
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db': round(self.db, 3),
+            'serializer': round(self.serializer, 3),
+            'view': round(self.view, 3),
+            'total': round(self.total, 3),
+        }
+
+
+@contextmanager
+def timer(name):
+    """Add the time spent in the block to the current request metrics."""
+    metrics = current.get()
+    if metrics is None or name in metrics.timing:
+        yield
+        return
+    metrics.timing.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timing.discard(name)
+        elapsed = (time.perf_counter() - started) * 1000
+        setattr(metrics, name, getattr(metrics, name) + elapsed)
+
+
+class Registry:
+    """Per-route aggregates of request metrics of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, metrics):
+        with self.lock:
+            stats = self.routes.setdefault(
+                route,
+                {
+                    'requests': 0,
+                    'queries': 0,
+                    'db': 0.0,
+                    'serializer': 0.0,
+                    'view': 0.0,
+                    'total': 0.0,
+                    'histogram': [0] * (len(BUCKETS) + 1),
+                },
+            )
+            stats['requests'] += 1
+            for name in ('queries', 'db', 'serializer', 'view', 'total'):
+                stats[name] += getattr(metrics, name)
+            bucket = next(
+                (
+                    num
+                    for num, bound in enumerate(BUCKETS)
+                    if metrics.total <= bound
+                ),
+                len(BUCKETS),
+            )
+            stats['histogram'][bucket] += 1
+
+    def snapshot(self):
+        """Return averages and the total time histogram of every route."""
+        with self.lock:
+            return {
+                route: {
+                    'requests': stats['requests'],
+                    'queries': stats['queries'] / stats['requests'],
+                    **{
+                        f'{name}_ms': stats[name] / stats['requests']
+                        for name in ('db', 'serializer', 'view', 'total')
+                    },
+                    'histogram': dict(
+                        zip(
+                            [f'<={bound}ms' for bound in BUCKETS]
+                            + [f'>{BUCKETS[-1]}ms'],
+                            stats['histogram'],
+                        ),
+                    ),
+                }
+                for route, stats in self.routes.items()
+            }
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+registry = Registry()
@@ -0,0 +1,178 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from api.metrics import RequestMetrics, current, registry
+from api.replicas import PIN_COOKIE, pin_user, replica_reads
+
+logger = logging.getLogger('api.metrics')
+
+
+class MetricsMiddleware:
+    """
+    Records SQL queries and timings of every request.
+
+    Results are sent as a `Server-Timing` header, logged as a JSON line
+    to the `api.metrics` logger and aggregated per route. The middleware
+    removes itself unless `API_METRICS_ENABLED` is set. It works under
+    WSGI and ASGI; under ASGI queries are recorded on the connections of
+    the thread running sync views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.API_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.recording(request, connections.all()):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        # Sync views run in a thread with connections of its own.
+        with self.recording(request, await sync_to_async(connections.all)()):
+            response = await self.get_response(request)
+        return self.finish(request, response)
+
+    @contextmanager
+    def recording(self, request, databases):
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        token = current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in databases:
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query),
+                    )
+                yield
+        finally:
+            current.reset(token)
+            metrics.total = (time.perf_counter() - started) * 1000
+
+    def finish(self, request, response):
+        metrics = request.metrics
+        if not metrics.view:
+            metrics.view = metrics.total
+        match = request.resolver_match
+        route = f'{request.method} {match.view_name if match else "-"}'
+        registry.add(route, metrics)
+        response['Server-Timing'] = ', '.join(
+            (
+                f'db;desc="{metrics.queries} queries";dur={metrics.db:.3f}',
+                f'serializer;dur={metrics.serializer:.3f}',
+                f'view;dur={metrics.view:.3f}',
+                f'total;dur={metrics.total:.3f}',
+            ),
+        )
+        logger.info(
+            json.dumps(
+                {
+                    'route': route,
+                    'path': request.path,
+                    'status': response.status_code,
+                    **metrics.as_dict(),
+                },
+            ),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        if request.metrics.view_started is None:
+            return response
+        request.metrics.view = (
+            time.perf_counter() - request.metrics.view_started
+        ) * 1000
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Let safe requests read from replicas, see `api.replicas`.
+
+    A successful unsafe request pins its client to the primary for
+    `REPLICA_PIN_SECONDS`, so the client reads its own writes while
+    replicas catch up. Authenticated users are pinned by id, which
+    authentication checks, and every client gets a cookie as well for
+    clients without credentials. The middleware removes itself unless
+    `DATABASE_REPLICAS` is set. One random replica serves all reads of a
+    request. It works under WSGI and ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.reads(request):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with self.reads(request):
+            response = await self.get_response(request)
+        # The user may be loaded lazily and the cache is sync.
+        return await sync_to_async(self.pin)(request, response)
+
+    @contextmanager
+    def reads(self, request):
+        safe = request.method in SAFE_METHODS
+        token = replica_reads.set(
+            (
+                random.choice(settings.DATABASE_REPLICAS)
+                if safe and PIN_COOKIE not in request.COOKIES
+                else None
+            ),
+        )
+        try:
+            yield
+        finally:
+            replica_reads.reset(token)
+
+    def pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        # DRF sets the user it authenticated on the request as well.
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_user(user.pk)
+        response.set_cookie(
+            PIN_COOKIE,
+            '1',
+            max_age=settings.REPLICA_PIN_SECONDS,
+            httponly=True,
+            samesite='Lax',
+        )
+        return response
@@ -1,9 +1,674 @@
-from rest_framework import filters, mixins, viewsets
+import functools
+import hashlib
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import Count, Max, Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator
+
+from api import cache
+from api.filters import FullTextSearchFilter, get_facets
+from api.metrics import timer
+from api.pagination import PubDateCursorPagination
 from api.permissions import AdminOrReadOnlyPermission
+from api.replicas import primary_reads
+from api.serializers import PreloadedSlugRelatedField
+
+# Marks bulk items whose lookup value does not fit the lookup field.
+INVALID = object()
+
+
+class CachedListMixin:
+    """
+    Serve anonymous list requests from the catalog cache.
+
+    Validator headers set by `ConditionalMixin` further down the MRO are
+    cached with the data, so hits answer conditional requests without
+    touching the database.
+    """
+
+    cache_namespace = None
+    cache_headers = ('ETag', 'Last-Modified')
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = cache.make_key(self.cache_namespace, request)
+        entry = cache.get_cache().get(key)
+        if entry is not None:
+            cache.count(cache.HITS)
+            return self.get_cached_response(request, *entry)
+        cache.count(cache.MISSES)
+        # Cached lists are served to every client for a long time, so
+        # they are read from the primary rather than a lagging replica.
+        with primary_reads():
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                name: response[name]
+                for name in self.cache_headers
+                if name in response
+            }
+            cache.get_cache().set(
+                key,
+                (response.data, headers),
+                settings.CATALOG_CACHE_TIMEOUT,
+            )
+        return response
+
+    def get_cached_response(self, request, data, headers):
+        response = None
+        if headers:
+            response = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    headers.get('Last-Modified'),
+                ),
+            )
+        if response is None:
+            response = Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+
+class FacetMixin:
+    """
+    Add facet counts of the filtered list with `?facets=genre,year`.
+
+    `?facets=1` returns every facet of `facet_names`.
+    """
+
+    facet_names = ()
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        names = self.get_facet_names()
+        if names and response.status_code == status.HTTP_200_OK:
+            response.data['facets'] = get_facets(
+                self.filter_queryset(self.get_queryset()),
+                names,
+            )
+        return response
+
+    def get_facet_names(self):
+        value = self.request.query_params.get('facets', '')
+        if value.lower() in ('1', 'true'):
+            return self.facet_names
+        requested = set(value.split(','))
+        return tuple(name for name in self.facet_names if name in requested)
+
+
+class ConditionalMixin:
+    """
+    Answer unchanged list and detail requests with 304 Not Modified.
+
+    When `conditional_date_field` is set, validators come from the row
+    count, the latest key and the latest date of the queryset, read with
+    a single aggregate query. The date field should change with every
+    update of a row, its latest value is the Last-Modified. Keyset pages
+    skip that query, the rows of the page itself are used instead and
+    reused to build the response. The cache version of
+    `conditional_namespace`, formatted with the URL kwargs and bumped by
+    model signals, is mixed in when the catalog cache is shared between
+    processes, or when there is no date field to go by; versions of a
+    process-local cache would give every worker its own ETags.
+    """
+
+    conditional_namespace = None
+    conditional_date_field = None
+
+    def get_validators(self):
+        """Return ETag source parts and the last change timestamp."""
+        parts, last_modified = [], None
+        field = self.conditional_date_field
+        if cache.is_shared() or not field:
+            version = cache.get_version(
+                self.conditional_namespace.format(**self.kwargs),
+            )
+            parts, last_modified = [version], version // 10**9
+        if not self.detail and isinstance(self.paginator, CursorPagination):
+            page = self.get_keyset_page()
+            parts.append(self.get_page_rows(page))
+            last = (
+                max((getattr(obj, field) for obj in page), default=None)
+                if field
+                else None
+            )
+        elif field:
+            queryset = self.filter_queryset(self.get_queryset())
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            if lookup_url_kwarg in self.kwargs:
+                queryset = queryset.filter(
+                    **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+                )
+            stats = queryset.aggregate(
+                last=Max(field),
+                last_pk=Max('pk'),
+                count=Count('pk'),
+            )
+            parts += [stats['count'], stats['last_pk'], stats['last']]
+            last = stats['last']
+        else:
+            last = None
+        if last:
+            last_modified = max(last_modified or 0, int(last.timestamp()))
+        return parts, last_modified
+
+    def get_keyset_page(self):
+        self.conditional_page = super().paginate_queryset(
+            self.filter_queryset(self.get_queryset()),
+        )
+        return self.conditional_page
+
+    def get_page_rows(self, page):
+        """Return the key, ordering and date values of the page rows."""
+        fields = ['pk', *self.paginator.ordering]
+        if self.conditional_date_field:
+            fields.append(self.conditional_date_field)
+        fields = [field.lstrip('-') for field in fields]
+        return [tuple(getattr(obj, field) for field in fields) for obj in page]
+
+    def paginate_queryset(self, queryset):
+        # The keyset page was fetched already to build the validators.
+        if hasattr(self, 'conditional_page'):
+            return self.conditional_page
+        return super().paginate_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        parts, last_modified = self.get_validators()
+        source = ':'.join(
+            str(part)
+            for part in (
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                *parts,
+            )
+        )
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class CursorPaginationMixin:
+    """Switch to keyset pagination with `?pagination=cursor`."""
+
+    cursor_pagination_class = PubDateCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            cursor_param = self.cursor_pagination_class.cursor_query_param
+            if params.get('pagination') != 'cursor' and (
+                cursor_param not in params
+            ):
+                return super().paginator
+            self._paginator = self.cursor_pagination_class()
+        return self._paginator
+
+
+class SparseFieldsMixin:
+    """
+    Pick fields with `?fields=id,name` and nested relations with `?expand=`.
+
+    Read requests load only the columns of requested fields, relations of
+    `sparse_select_related` and `sparse_prefetch_related` are joined or
+    prefetched only when requested, and unexpanded ones load just the
+    compact column mapped to them. Without `expand` the relations of
+    `sparse_default_expand` are nested. Columns of `sparse_required` are
+    always loaded, such as the ordering, the key to the parent object or
+    the `conditional_date_field` of ETags.
+    """
+
+    sparse_columns = {}
+    sparse_select_related = {}
+    sparse_prefetch_related = {}
+    sparse_default_expand = ()
+    sparse_required = ()
+
+    @cached_property
+    def sparse(self):
+        """Return requested `(fields, expand)`, None when not limited."""
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        serializer_class = self.get_serializer_class()
+        return (
+            self.get_sparse_param('fields', set(serializer_class().fields)),
+            self.get_sparse_param('expand', set(serializer_class.expandable)),
+        )
+
+    def get_sparse_param(self, name, allowed):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        names = {item.strip() for item in value.split(',') if item.strip()}
+        unknown = names - allowed
+        if unknown:
+            raise ValidationError(
+                {name: [f'Неизвестные поля: {", ".join(sorted(unknown))}.']},
+            )
+        return names
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields, expand = self.sparse
+        if fields is not None:
+            context['fields'] = fields
+        if expand is not None:
+            context['expand'] = expand
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, expand = self.sparse
+        if fields is None and expand is None:
+            return queryset
+        if fields is None:
+            fields = set(self.get_serializer_class()().fields)
+        if expand is None:
+            expand = set(self.sparse_default_expand)
+        opts = queryset.model._meta
+        concrete = {field.name for field in opts.concrete_fields}
+        columns = {opts.pk.name, *self.sparse_required}
+        queryset = queryset.select_related(None).prefetch_related(None)
+        for name in fields:
+            if name in self.sparse_select_related:
+                queryset = queryset.select_related(name)
+                columns.add(name)
+                if name not in expand:
+                    columns.add(f'{name}__{self.sparse_select_related[name]}')
+            elif name in self.sparse_prefetch_related:
+                related = opts.get_field(name).related_model.objects.all()
+                if name not in expand:
+                    related = related.only(self.sparse_prefetch_related[name])
+                queryset = queryset.prefetch_related(
+                    Prefetch(name, queryset=related),
+                )
+            else:
+                columns.update(
+                    self.sparse_columns.get(
+                        name,
+                        (name,) if name in concrete else (),
+                    ),
+                )
+        return queryset.only(*columns)
+
+
+class TimedData:
+    """Count time spent in `data` towards the request metrics."""
+
+    @property
+    def data(self):
+        with timer('serializer'):
+            return super().data
+
+
+@functools.cache
+def get_timed_class(serializer_class):
+    """Return a subclass of `serializer_class` timing `data`, many too."""
+    meta = getattr(serializer_class, 'Meta', object)
+    list_class = getattr(
+        meta,
+        'list_serializer_class',
+        serializers.ListSerializer,
+    )
+
+    class TimedList(TimedData, list_class):
+        pass
+
+    class Timed(TimedData, serializer_class):
+        class Meta(meta):
+            list_serializer_class = TimedList
+
+    Timed.__name__ = Timed.__qualname__ = serializer_class.__name__
+    return Timed
+
+
+class TimedSerializerMixin:
+    """
+    Count time spent in serializer `data` towards the request metrics.
+
+    Serializers of the view are created from a subclass of their class,
+    built once per class, so serializers need no timing code of their own.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = get_timed_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+class BulkMixin:
+    """
+    Bulk create, update and delete at `<list url>/bulk/`.
+
+    The body is a list of objects to create (POST), of objects with their
+    lookup field to update (PATCH) or of lookup values to delete
+    (DELETE). Related slugs and unique values of all items are checked
+    with one query per field, valid items are written in one transaction
+    and the response has a result per item, in request order.
+    """
+
+    bulk_max_items = 1000
+    bulk_invalidate = ()
+
+    @action(
+        detail=False,
+        methods=['post', 'patch', 'delete'],
+        url_path='bulk',
+    )
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['Ожидается список.']},
+            )
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        f'Не больше {self.bulk_max_items} объектов '
+                        'за запрос.',
+                    ],
+                },
+            )
+        handler = {
+            'POST': self.bulk_create,
+            'PATCH': self.bulk_update,
+            'DELETE': self.bulk_destroy,
+        }[request.method]
+        with transaction.atomic():
+            results = handler(items)
+        cache.invalidate(*self.bulk_invalidate)
+        failed = any(result['status'] >= 400 for result in results)
+        return Response(
+            results,
+            status=(
+                status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK
+            ),
+        )
+
+    @property
+    def bulk_lookup(self):
+        model = self.get_queryset().model
+        if self.lookup_field == 'pk':
+            return model._meta.pk.name
+        return self.lookup_field
+
+    def bulk_create(self, items):
+        return self.bulk_save(
+            items,
+            [None] * len(items),
+            status.HTTP_201_CREATED,
+        )
+
+    def bulk_update(self, items):
+        lookup = self.bulk_lookup
+        keys = [
+            self.bulk_key(item.get(lookup) if isinstance(item, dict) else None)
+            for item in items
+        ]
+        found = self.get_queryset().in_bulk(
+            {key for key in keys if key is not INVALID},
+            field_name=lookup,
+        )
+        return self.bulk_save(
+            items,
+            [
+                key if key is INVALID else found.get(key, NotFound)
+                for key in keys
+            ],
+            status.HTTP_200_OK,
+        )
+
+    def bulk_destroy(self, items):
+        lookup = self.bulk_lookup
+        keys = [self.bulk_key(item) for item in items]
+        queryset = self.get_queryset().filter(
+            **{f'{lookup}__in': {key for key in keys if key is not INVALID}},
+        )
+        found = set(queryset.values_list(lookup, flat=True))
+        queryset.delete()
+        results = []
+        for item, key in zip(items, keys):
+            if key is INVALID:
+                results.append(self.bulk_invalid())
+            elif key in found:
+                results.append(
+                    {'status': status.HTTP_204_NO_CONTENT, lookup: item},
+                )
+            else:
+                results.append(self.bulk_not_found())
+        return results
+
+    def bulk_key(self, value):
+        """Convert a lookup value to the field type, INVALID if it fails."""
+        field = self.get_queryset().model._meta.get_field(self.bulk_lookup)
+        if value is None or isinstance(value, (dict, list, bool)):
+            return INVALID
+        try:
+            return field.to_python(value)
+        except DjangoValidationError:
+            return INVALID
+
+    def bulk_invalid(self):
+        return {
+            'status': status.HTTP_400_BAD_REQUEST,
+            'errors': {self.bulk_lookup: ['Некорректное значение.']},
+        }
+
+    def bulk_not_found(self):
+        return {
+            'status': status.HTTP_404_NOT_FOUND,
+            'errors': {'detail': NotFound.default_detail},
+        }
+
+    def bulk_save(self, items, instances, success):
+        context = {
+            **self.get_serializer_context(),
+            'preloaded': self.preload(items),
+        }
+        serializers = [
+            (
+                None
+                if instance is NotFound or instance is INVALID
+                else self.get_serializer_class()(
+                    instance,
+                    data=item,
+                    partial=instance is not None,
+                    context=context,
+                )
+            )
+            for item, instance in zip(items, instances)
+        ]
+        self.validate_items([item for item in serializers if item])
+        valid = [item for item in serializers if item and not item.errors]
+        objs = self.write(valid, create=success == status.HTTP_201_CREATED)
+        saved = self.get_queryset().in_bulk([obj.pk for obj in objs])
+        results = []
+        for instance, serializer in zip(instances, serializers):
+            if instance is INVALID:
+                results.append(self.bulk_invalid())
+            elif serializer is None:
+                results.append(self.bulk_not_found())
+            elif serializer.errors:
+                results.append(
+                    {
+                        'status': status.HTTP_400_BAD_REQUEST,
+                        'errors': serializer.errors,
+                    },
+                )
+            else:
+                instance = saved[serializer.instance.pk]
+                results.append(
+                    {
+                        'status': success,
+                        'data': self.get_serializer(instance).data,
+                    },
+                )
+        return results
+
+    def preload(self, items):
+        """Resolve related slugs of all items, one query per field."""
+        preloaded = {}
+        for name, field in self.get_serializer().fields.items():
+            child = getattr(field, 'child_relation', field)
+            if field.read_only or not isinstance(
+                child,
+                PreloadedSlugRelatedField,
+            ):
+                continue
+            values = set()
+            for item in items:
+                value = item.get(name) if isinstance(item, dict) else None
+                if isinstance(value, list):
+                    values.update(map(str, value))
+                elif value is not None:
+                    values.add(str(value))
+            preloaded[name] = {
+                str(getattr(obj, child.slug_field)): obj
+                for obj in child.get_queryset().filter(
+                    **{f'{child.slug_field}__in': values},
+                )
+            }
+        return preloaded
+
+    def validate_items(self, serializers):
+        """Validate items, checking unique fields with one query each."""
+        model = self.get_queryset().model
+        unique = [
+            field.name
+            for field in model._meta.concrete_fields
+            if field.unique and not field.primary_key
+        ]
+        for serializer in serializers:
+            for name in unique:
+                if name in serializer.fields:
+                    field = serializer.fields[name]
+                    field.validators = [
+                        validator
+                        for validator in field.validators
+                        if not isinstance(validator, UniqueValidator)
+                    ]
+            serializer.is_valid()
+        for name in unique:
+            self.validate_unique(model, name, serializers)
+
+    def validate_unique(self, model, name, serializers):
+        valid = [
+            serializer
+            for serializer in serializers
+            if not serializer.errors and name in serializer.validated_data
+        ]
+        values = [serializer.validated_data[name] for serializer in valid]
+        taken = dict(
+            model.objects.filter(**{f'{name}__in': values}).values_list(
+                name,
+                'pk',
+            ),
+        )
+        for serializer, value in zip(valid, values):
+            own = serializer.instance.pk if serializer.instance else None
+            if taken.get(value, own) != own:
+                serializer._errors = {name: [UniqueValidator.message]}
+            else:
+                taken[value] = object()
+
+    def write(self, serializers, create):
+        """Save validated items with bulk queries, return the objects."""
+        model = self.get_queryset().model
+        many = [field.name for field in model._meta.many_to_many]
+        objs, related, fields = [], [], set()
+        auto_now = [
+            field
+            for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False)
+        ]
+        for serializer in serializers:
+            data = dict(serializer.validated_data)
+            related.append(
+                {name: data.pop(name) for name in many if name in data}
+            )
+            obj = serializer.instance or model()
+            for name, value in data.items():
+                setattr(obj, name, value)
+            # bulk_update() does not fill `auto_now` fields itself.
+            for field in auto_now:
+                field.pre_save(obj, add=False)
+            fields.update(data)
+            objs.append(obj)
+            serializer.instance = obj
+        if create and connection.features.can_return_rows_from_bulk_insert:
+            model.objects.bulk_create(objs)
+        elif create:
+            for obj in objs:
+                obj.save()
+        elif fields or auto_now:
+            model.objects.bulk_update(
+                objs,
+                [*fields, *(field.name for field in auto_now)],
+            )
+        for name in many:
+            self.write_many(model._meta.get_field(name), objs, related, create)
+        return objs
+
+    def write_many(self, field, objs, related, create):
+        changed = [
+            (obj, values[field.name])
+            for obj, values in zip(objs, related)
+            if field.name in values
+        ]
+        if not changed:
+            return
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        if not create:
+            through.objects.filter(
+                **{f'{source}__in': [obj for obj, _ in changed]},
+            ).delete()
+        through.objects.bulk_create(
+            [
+                through(**{source: obj, target: value})
+                for obj, values in changed
+                for value in values
+            ],
+        )
 
 
 class CreateDeleteListViewSet(
+    BulkMixin,
+    CachedListMixin,
+    TimedSerializerMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.DestroyModelMixin,
@@ -12,6 +677,6 @@ class CreateDeleteListViewSet(
     """ViewSet for model creation, deletion and list view."""
 
     lookup_field = 'slug'
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (FullTextSearchFilter,)
     search_fields = ('name',)
     permission_classes = (AdminOrReadOnlyPermission,)
@@ -0,0 +1,245 @@
+import logging
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from api.metrics import percentile
+from reviews.models import OutboxEmail
+
+logger = logging.getLogger('api.outbox')
+
+
+def enqueue(subject, body, to):
+    """Store an email in the outbox and wake the worker after commit."""
+    email = OutboxEmail.objects.create(subject=subject, body=body, to=to)
+    transaction.on_commit(worker.wake)
+    return email
+
+
+def get_pending():
+    return OutboxEmail.objects.filter(
+        sent=None,
+        attempts__lt=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    )
+
+
+def claim(limit):
+    """
+    Lease up to `limit` due emails to the caller.
+
+    The lease moves `send_after` forward in a single UPDATE, so emails
+    claimed by another thread or process are skipped, and emails of a
+    crashed worker become due again when the lease expires.
+    """
+    now = timezone.now()
+    token = uuid.uuid4()
+    ids = list(
+        get_pending()
+        .filter(send_after__lte=now)
+        .order_by('send_after', 'id')
+        .values_list('pk', flat=True)[:limit],
+    )
+    if not ids:
+        return []
+    OutboxEmail.objects.filter(
+        pk__in=ids,
+        sent=None,
+        send_after__lte=now,
+    ).update(
+        claim=token,
+        send_after=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE),
+    )
+    return list(OutboxEmail.objects.filter(claim=token))
+
+
+def get_backoff(attempts):
+    return timedelta(
+        seconds=min(
+            settings.EMAIL_OUTBOX_BACKOFF * 2 ** (attempts - 1),
+            settings.EMAIL_OUTBOX_MAX_BACKOFF,
+        ),
+    )
+
+
+def retry(email, error, now):
+    """Record a failed attempt and schedule the next one."""
+    attempts = email.attempts + 1
+    OutboxEmail.objects.filter(pk=email.pk).update(
+        attempts=attempts,
+        send_after=now + get_backoff(attempts),
+        claim=None,
+        last_error=repr(error),
+    )
+    level = (
+        logging.ERROR
+        if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        else logging.WARNING
+    )
+    logger.log(level, 'Email %s, attempt %s: %r', email.pk, attempts, error)
+
+
+def send_batch(emails):
+    """Send `emails` over one connection and record the results."""
+    delivered, failed = [], []
+    backend = get_connection()
+    try:
+        backend.open()
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, to=[email.to])
+            try:
+                backend.send_messages([message])
+            except Exception as error:
+                failed.append((email, error))
+            else:
+                delivered.append(email)
+    except Exception as error:
+        done = {email.pk for email in delivered}
+        failed.extend(
+            (email, error) for email in emails if email.pk not in done
+        )
+    finally:
+        with suppress(Exception):
+            backend.close()
+    now = timezone.now()
+    OutboxEmail.objects.filter(
+        pk__in=[email.pk for email in delivered]
+    ).update(
+        sent=now,
+        claim=None,
+        # Bodies carry confirmation codes, they are not kept once sent.
+        body='',
+    )
+    for email, error in failed:
+        retry(email, error, now)
+    stats.add(
+        [(now - email.created).total_seconds() for email in delivered],
+        len(failed),
+    )
+    return len(delivered)
+
+
+def send_batch_in_thread(emails):
+    try:
+        return send_batch(emails)
+    finally:
+        connection.close()
+
+
+def deliver():
+    """Send every due email, return how many were delivered."""
+    size = settings.EMAIL_OUTBOX_BATCH_SIZE
+    # SQLite allows a single writer, so batches are sent one by one.
+    workers = (
+        1 if connection.vendor == 'sqlite' else settings.EMAIL_OUTBOX_WORKERS
+    )
+    total = 0
+    while True:
+        emails = claim(size * workers)
+        if not emails:
+            return total
+        batches = [
+            emails[num::workers] for num in range(min(workers, len(emails)))
+        ]
+        if len(batches) == 1:
+            total += send_batch(batches[0])
+            continue
+        with ThreadPoolExecutor(len(batches)) as executor:
+            total += sum(executor.map(send_batch_in_thread, batches))
+
+
+class Stats:
+    """Delivery counters and latencies, in seconds, of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.delivered = 0
+            self.failed = 0
+            self.latencies = deque(maxlen=1000)
+
+    def add(self, latencies, failed):
+        with self.lock:
+            self.delivered += len(latencies)
+            self.failed += failed
+            self.latencies.extend(latencies)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            delivered, failed = self.delivered, self.failed
+        return {
+            'pending': get_pending().count(),
+            'dead': OutboxEmail.objects.filter(
+                sent=None,
+                attempts__gte=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            ).count(),
+            'delivered': delivered,
+            'failed_attempts': failed,
+            'latency_p50': percentile(latencies, 50) if latencies else None,
+            'latency_p95': percentile(latencies, 95) if latencies else None,
+        }
+
+
+class Worker:
+    """
+    Background thread that drains the outbox of this process.
+
+    It starts with the first request of the process, sends emails left
+    over from before a restart, then polls for retries every
+    `EMAIL_OUTBOX_POLL_INTERVAL` seconds. Queued emails wake it early.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start the thread unless it runs, return whether it runs."""
+        if not settings.EMAIL_OUTBOX_WORKER:
+            return False
+        if self.thread is not None and self.thread.is_alive():
+            return True
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name='email-outbox',
+                    daemon=True,
+                )
+                self.thread.start()
+        return True
+
+    def wake(self):
+        if self.start():
+            self.event.set()
+
+    def run(self):
+        while True:
+            self.event.clear()
+            close_old_connections()
+            try:
+                deliver()
+            except Exception:
+                logger.exception('Outbox delivery failed.')
+            self.event.wait(settings.EMAIL_OUTBOX_POLL_INTERVAL)
+
+
+stats = Stats()
+worker = Worker()
+
+
+def start_worker(**kwargs):
+    """Receiver of `request_started` connected by `ApiConfig`."""
+    worker.start()
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PubDateCursorPagination(CursorPagination):
+    """Keyset pagination over `(pub_date, id)`, newest first."""
+
+    ordering = ('-pub_date', '-id')
+
+
+class RankingCursorPagination(CursorPagination):
+    """Keyset pagination over the annotated `(rank, rank_id)`, best first."""
+
+    ordering = ('-rank', '-rank_id')
@@ -23,7 +23,7 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return obj.author == request.user or request.user.role in [
+        return obj.author_id == request.user.pk or request.user.role in [
             ADMIN,
             MODERATOR,
         ]
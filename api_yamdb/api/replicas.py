@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The replica alias `ReplicaMiddleware` chose for the current request,
+# None while reads go to the primary.
+replica_reads = ContextVar('replica_reads', default=None)
+
+PIN_COOKIE = 'primary_pin'
+
+
+def pin_key(pk):
+    return f'replica:pin:{pk}'
+
+
+def pin_user(pk):
+    """
+    Read from the primary for requests of the user for a while.
+
+    The mark lives in the default cache, so with a shared cache backend
+    it reaches every process.
+    """
+    cache.set(pin_key(pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def follow_pin(pk):
+    """Switch the current request to the primary if the user is pinned."""
+    if replica_reads.get() and cache.get(pin_key(pk)):
+        replica_reads.set(None)
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block."""
+    token = replica_reads.set(None)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads of safe requests to the replica chosen for the request.
+
+    Every query of a request reads from the same replica, so the request
+    sees one consistent state even when replicas lag differently.
+    Everything else uses the primary: writes, reads inside a transaction,
+    reads outside of requests and requests of pinned clients.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_reads.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get the schema from the primary.
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,169 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.models import Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Indexed models with column weights used for ranking.
+SEARCH_INDEXES = {
+    'reviews.Title': {'name': 10.0, 'description': 1.0},
+    'reviews.Genre': {'name': 1.0},
+    'reviews.Category': {'name': 1.0},
+    'reviews.User': {'username': 1.0},
+}
+
+MAX_TERMS = 10
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class BaseSearchBackend:
+    """Interface of full-text search backends."""
+
+    def install(self, connection, get_model=apps.get_model):
+        """Create or refresh index structures of `SEARCH_INDEXES`."""
+
+    def uninstall(self, connection, get_model=apps.get_model):
+        """Drop index structures created by `install`."""
+
+    def search(self, queryset, fields, query):
+        """Filter `queryset` by `query` over `fields`, best matches first."""
+        raise NotImplementedError
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+    Portable search without an index.
+
+    Every term has to occur in one of the fields; rows whose first field
+    starts with the query come first.
+    """
+
+    def search(self, queryset, fields, query):
+        terms = get_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                reduce(
+                    or_,
+                    (Q(**{f'{field}__icontains': term}) for field in fields),
+                ),
+            )
+        return queryset.annotate(
+            search_rank=Case(
+                When(**{f'{fields[0]}__istartswith': terms[0]}, then=Value(0)),
+                default=Value(1),
+            ),
+        ).order_by('search_rank', 'pk')
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """
+    SQLite FTS5 external content indexes kept in sync by triggers.
+
+    Terms are matched as prefixes and rows are ranked with bm25. Django
+    drops triggers when it rebuilds a table in a migration, run
+    `manage.py rebuildsearch` after such migrations.
+    """
+
+    fallback = LikeSearchBackend()
+
+    def get_table(self, model):
+        return f'{model._meta.db_table}_fts'
+
+    def install(self, connection, get_model=apps.get_model):
+        with connection.cursor() as cursor:
+            for label, weights in SEARCH_INDEXES.items():
+                model = get_model(label)
+                for sql in self.get_install_sql(model, weights):
+                    cursor.execute(sql)
+
+    def get_install_sql(self, model, weights):
+        table = self.get_table(model)
+        source = model._meta.db_table
+        pk = model._meta.pk.column
+        columns = [model._meta.get_field(name).column for name in weights]
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        delete = (
+            f'INSERT INTO {table}({table}, rowid, {names}) '
+            f"VALUES ('delete', old.{pk}, {old});"
+        )
+        insert = (
+            f'INSERT INTO {table}(rowid, {names}) VALUES (new.{pk}, {new});'
+        )
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+            f"{names}, content='{source}', content_rowid='{pk}', "
+            "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+            *(
+                f'DROP TRIGGER IF EXISTS {table}_{suffix}'
+                for suffix in ('ai', 'ad', 'au')
+            ),
+            f'CREATE TRIGGER {table}_ai AFTER INSERT ON {source} '
+            f'BEGIN {insert} END',
+            f'CREATE TRIGGER {table}_ad AFTER DELETE ON {source} '
+            f'BEGIN {delete} END',
+            f'CREATE TRIGGER {table}_au AFTER UPDATE OF {names} ON {source} '
+            f'BEGIN {delete} {insert} END',
+            f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+        ]
+
+    def uninstall(self, connection, get_model=apps.get_model):
+        with connection.cursor() as cursor:
+            for label in SEARCH_INDEXES:
+                table = self.get_table(get_model(label))
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+    def search(self, queryset, fields, query):
+        model = queryset.model
+        weights = SEARCH_INDEXES.get(model._meta.label)
+        if weights is None or not set(fields) <= set(weights):
+            return self.fallback.search(queryset, fields, query)
+        terms = get_terms(query)
+        if not terms:
+            return queryset.none()
+        columns = ' '.join(
+            model._meta.get_field(name).column for name in fields
+        )
+        prefixes = ' '.join(f'"{term}"*' for term in terms)
+        match = f'{{{columns}}} : ({prefixes})'
+        table = self.get_table(model)
+        ranking = ', '.join(str(weight) for weight in weights.values())
+        return (
+            queryset.filter(
+                pk__in=RawSQL(
+                    f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+                    (match,),
+                ),
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f'SELECT bm25({table}, {ranking}) FROM {table} '
+                    f'WHERE {table} MATCH %s AND rowid = '
+                    f'{model._meta.db_table}.{model._meta.pk.column}',
+                    (match,),
+                ),
+            )
+            .order_by('search_rank', 'pk')
+        )
+
+
+def get_backend(connection=default_connection):
+    """Return the configured backend or the best one for the database."""
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5SearchBackend()
+    return LikeSearchBackend()
@@ -1,3 +1,6 @@
+from functools import partial
+
+from django.utils.encoding import smart_str
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
@@ -5,6 +8,51 @@ from api.validators import validate_username
 from reviews.models import Category, Comment, Genre, Review, Title, User
 
 
+class PreloadedSlugRelatedField(serializers.SlugRelatedField):
+    """Slug field resolved from `context['preloaded']` when available."""
+
+    def to_internal_value(self, data):
+        name = self.field_name or self.parent.field_name
+        preloaded = self.context.get('preloaded', {}).get(name)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        try:
+            return preloaded[str(data)]
+        except KeyError:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data),
+            )
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Limit output to `context['fields']` and pick relation formats.
+
+    `expandable` maps relations to factories of their compact and nested
+    fields. With `context['expand']` set, only the relations named there
+    are nested, otherwise the declared fields are used.
+    """
+
+    expandable = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand')
+        if expand is not None:
+            for name, (compact, nested) in self.expandable.items():
+                fields[name] = nested() if name in expand else compact()
+        requested = self.context.get('fields')
+        if requested is not None:
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in requested
+            }
+        return fields
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -17,22 +65,55 @@ class GenreSerializer(serializers.ModelSerializer):
         exclude = ('id',)
 
 
-class TitleSerializer(serializers.ModelSerializer):
+class AuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('username', 'first_name', 'last_name', 'bio')
+
+
+class TitleSerializer(
+    SparseFieldsSerializerMixin,
+    serializers.ModelSerializer,
+):
     category = CategorySerializer()
     genre = GenreSerializer(many=True)
     rating = serializers.FloatField(read_only=True)
 
+    expandable = {
+        'category': (
+            partial(
+                serializers.SlugRelatedField,
+                slug_field='slug',
+                read_only=True,
+            ),
+            CategorySerializer,
+        ),
+        'genre': (
+            partial(
+                serializers.SlugRelatedField,
+                slug_field='slug',
+                many=True,
+                read_only=True,
+            ),
+            partial(GenreSerializer, many=True),
+        ),
+    }
+
     class Meta:
         model = Title
-        fields = '__all__'
+        exclude = ('rating_sum', 'rating_count', 'updated')
+
+
+class RankedTitleSerializer(TitleSerializer):
+    score = serializers.FloatField(source='rank', read_only=True)
 
 
 class TitleManageSerializer(serializers.ModelSerializer):
-    category = serializers.SlugRelatedField(
+    category = PreloadedSlugRelatedField(
         slug_field='slug',
         queryset=Category.objects.all(),
     )
-    genre = serializers.SlugRelatedField(
+    genre = PreloadedSlugRelatedField(
         slug_field='slug',
         many=True,
         queryset=Genre.objects.all(),
@@ -40,7 +121,7 @@ class TitleManageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Title
-        fields = '__all__'
+        exclude = ('rating_sum', 'rating_count', 'updated')
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -94,34 +175,48 @@ class TokenSerializer(serializers.ModelSerializer):
         fields = ('username', 'confirmation_code')
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(
+    SparseFieldsSerializerMixin,
+    serializers.ModelSerializer,
+):
     author = serializers.StringRelatedField(read_only=True)
 
+    expandable = {
+        'author': (
+            partial(serializers.StringRelatedField, read_only=True),
+            partial(AuthorSerializer, read_only=True),
+        ),
+    }
+
+    default_error_messages = {
+        'unique_review': (
+            'Вы можете оставить только один отзыв на произведение.'
+        ),
+    }
+
     class Meta:
         model = Review
         fields = ('id', 'text', 'author', 'score', 'pub_date')
 
-    def validate(self, attrs):
-        if self.instance is None:
-            title_id = self.context['view'].kwargs['title_id']
-            author = self.context['request'].user
-            if Review.objects.filter(
-                title_id=title_id, author=author,
-            ).exists():
-                raise serializers.ValidationError(
-                    'Вы можете оставить только один отзыв на произведение.',
-                )
-        return attrs
-
     def validate_score(self, value):
         if value < 1 or value > 10:
             raise serializers.ValidationError('Оценка должна быть от 1 до 10')
         return value
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(
+    SparseFieldsSerializerMixin,
+    serializers.ModelSerializer,
+):
     author = serializers.StringRelatedField(read_only=True)
 
+    expandable = {
+        'author': (
+            partial(serializers.StringRelatedField, read_only=True),
+            partial(AuthorSerializer, read_only=True),
+        ),
+    }
+
     class Meta:
         model = Comment
         fields = ('id', 'text', 'author', 'pub_date')
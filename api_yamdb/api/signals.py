@@ -0,0 +1,102 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from api.authentication import invalidate_user
+from api.cache import invalidate
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    Review,
+    Title,
+    TitleGenre,
+    TitleRanking,
+    User,
+)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(**kwargs):
+    invalidate('category', 'title')
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genres(**kwargs):
+    invalidate('genre', 'title')
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def touch_category_titles(instance, created=False, **kwargs):
+    # Titles nest their category, a rename or removal changes them.
+    if not created:
+        Title.objects.filter(category=instance).touch()
+
+
+@receiver(post_save, sender=Genre)
+def touch_genre_titles(instance, created=False, **kwargs):
+    if not created:
+        Title.objects.filter(genre=instance).touch()
+
+
+@receiver(post_save, sender=TitleGenre)
+@receiver(post_delete, sender=TitleGenre)
+def touch_title_of_genre(instance, **kwargs):
+    Title.objects.filter(pk=instance.title_id).touch()
+
+
+@receiver(m2m_changed, sender=TitleGenre)
+def touch_titles_of_genres(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Title.objects.filter(pk=instance.pk).touch()
+    elif pk_set:
+        Title.objects.filter(pk__in=pk_set).touch()
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+@receiver(post_save, sender=TitleGenre)
+@receiver(post_delete, sender=TitleGenre)
+@receiver(m2m_changed, sender=TitleGenre)
+def invalidate_titles(action='post_save', **kwargs):
+    if action.startswith('post_'):
+        invalidate('title')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviews(instance, **kwargs):
+    invalidate('title', f'review:{instance.title_id}')
+
+
+@receiver(post_delete, sender=Review)
+def update_title_rating(instance, origin=None, **kwargs):
+    # Runs for every way a review goes away: the API, the admin and
+    # cascades from a deleted user. Reviews of a deleted title need no
+    # update, the title and its ranking are deleted with them.
+    if getattr(origin, 'model', type(origin)) is Title:
+        return
+    Title.objects.filter(pk=instance.title_id).update_ratings()
+    TitleRanking.objects.refresh([instance.title_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(instance, **kwargs):
+    invalidate(f'comment:{instance.review_id}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_claims(instance, created=False, **kwargs):
+    if not created:
+        invalidate_user(instance.pk)
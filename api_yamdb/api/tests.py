@@ -1,9 +1,67 @@
+import csv
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from mixer.backend.django import mixer
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIClient,
+    APITestCase,
+    APITransactionTestCase,
+)
+
+from api import outbox, renderers, throttling
+from api.authentication import get_token, user_cache
+from api.cache import get_cache
+from api.metrics import registry
+from api.replicas import PIN_COOKIE, pin_key
+from api.serializers import ReviewSerializer
+from api_yamdb.admin import EstimatedCountPaginator
+from reviews.management.commands.importcsv import DATA, get_dependencies
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    OutboxEmail,
+    Review,
+    Title,
+    TitleGenre,
+    TitleRanking,
+    User,
+)
+
+# Token buckets outlive test transactions and user ids are reused after
+# rollbacks, so throttling is only enabled by `ThrottleTests`. The outbox
+# worker thread would compete with tests for the test database.
+background_disabled = override_settings(
+    THROTTLE_ENABLED=False,
+    EMAIL_OUTBOX_WORKER=False,
+)
+
 
-from reviews.models import Category, Genre, Title, User
+def setUpModule():
+    background_disabled.enable()
+
+
+def tearDownModule():
+    background_disabled.disable()
 
 
 class CategoryTests(APITestCase):
@@ -219,3 +277,1642 @@ class TitleTests(APITestCase):
             'Нельзя указывать произведения из будущего!',
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RatingTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.user_client = mixer.blend(User), APIClient()
+        cls.user_client.force_authenticate(cls.user)
+        cls.title = mixer.blend(Title)
+
+    def get_rating(self):
+        url = reverse('api:title-detail', args=(self.title.pk,))
+        return self.client.get(url).json()['rating']
+
+    def test_rating_follows_reviews(self):
+        """Ensure stored rating is updated on review changes."""
+        self.assertIsNone(self.get_rating())
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        response = self.user_client.post(
+            url,
+            {'text': 'Хорошо', 'score': 8},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_rating(), 8)
+        url = reverse(
+            'api:reviews-detail',
+            args=(self.title.pk, response.json()['id']),
+        )
+        self.user_client.patch(url, {'score': 2}, format='json')
+        self.assertEqual(self.get_rating(), 2)
+        self.user_client.delete(url)
+        self.assertIsNone(self.get_rating())
+
+    def test_rating_follows_cascades(self):
+        """Ensure reviews deleted with their author leave the rating."""
+        author, other = mixer.cycle(2).blend(User)
+        for user, score in ((author, 9), (other, 3)):
+            client = APIClient()
+            client.force_authenticate(user)
+            client.post(
+                reverse('api:reviews-list', args=(self.title.pk,)),
+                {'text': 'Отзыв', 'score': score},
+                format='json',
+            )
+        admin_client = APIClient()
+        admin_client.force_authenticate(mixer.blend(User, role='admin'))
+        admin_client.delete(
+            reverse('api:users-detail', args=(author.username,)),
+        )
+        self.assertEqual(self.get_rating(), 3)
+        self.assertTrue(TitleRanking.objects.filter(title=self.title).exists())
+        other.delete()
+        self.title.refresh_from_db()
+        self.assertEqual(
+            (self.title.rating_sum, self.title.rating_count),
+            (0, 0),
+        )
+        self.assertFalse(
+            TitleRanking.objects.filter(title=self.title).exists()
+        )
+
+    def test_update_ratings_command(self):
+        """Ensure stored ratings can be rebuilt from reviews."""
+        mixer.blend(Review, title=self.title, score=7)
+        mixer.blend(Review, title=self.title, score=10)
+        self.assertIsNone(self.get_rating())
+        call_command('updateratings', stdout=StringIO())
+        self.assertEqual(self.get_rating(), 8.5)
+
+
+class QueryCountTests(APITestCase):
+    """Ensure endpoints run a constant number of queries per page."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin, cls.admin_client = (
+            mixer.blend(User, role='admin'),
+            APIClient(),
+        )
+        cls.admin_client.force_authenticate(cls.admin)
+        genres = mixer.cycle(3).blend(Genre)
+        categories = mixer.cycle(3).blend(Category)
+        cls.titles = mixer.cycle(25).blend(
+            Title,
+            category=mixer.sequence(*categories),
+        )
+        for title in cls.titles:
+            title.genre.set(genres)
+        cls.title = cls.titles[0]
+        reviews = mixer.cycle(25).blend(Review, title=cls.title)
+        cls.review = reviews[0]
+        mixer.cycle(25).blend(Comment, review=cls.review)
+
+    def assertQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_category_list(self):
+        self.assertQueries(2, reverse('api:category-list'))
+
+    def test_genre_list(self):
+        self.assertQueries(2, reverse('api:genre-list'))
+
+    def test_title_list(self):
+        self.assertQueries(4, reverse('api:title-list'))
+
+    def test_title_list_facets(self):
+        self.assertQueries(5, reverse('api:title-list') + '?facets=1')
+
+    def test_title_detail(self):
+        self.assertQueries(
+            3,
+            reverse('api:title-detail', args=(self.title.pk,)),
+        )
+
+    def test_review_list(self):
+        self.assertQueries(
+            4,
+            reverse('api:reviews-list', args=(self.title.pk,)),
+        )
+
+    def test_review_detail(self):
+        self.assertQueries(
+            3,
+            reverse(
+                'api:reviews-detail',
+                args=(self.title.pk, self.review.pk),
+            ),
+        )
+
+    def test_comment_list(self):
+        self.assertQueries(
+            4,
+            reverse(
+                'api:comments-list',
+                args=(self.title.pk, self.review.pk),
+            ),
+        )
+
+    def test_comment_detail(self):
+        comment = self.review.comments.first()
+        self.assertQueries(
+            3,
+            reverse(
+                'api:comments-detail',
+                args=(self.title.pk, self.review.pk, comment.pk),
+            ),
+        )
+
+    def test_user_list(self):
+        self.assertQueries(2, reverse('api:users-list'))
+
+    def test_user_detail(self):
+        self.assertQueries(
+            1,
+            reverse('api:users-detail', args=(self.admin.username,)),
+        )
+
+
+class ImportCsvTests(APITestCase):
+    def test_import_is_idempotent(self):
+        """Ensure repeated imports upsert rows instead of duplicating."""
+        call_command('importcsv', silent=True, batch_size=10)
+        call_command('importcsv', silent=True)
+        self.assertEqual(Title.objects.count(), 32)
+        self.assertEqual(Review.objects.count(), 72)
+        self.assertEqual(Title.objects.get(pk=1).rating, 10)
+
+    def test_import_keeps_dates(self):
+        """Ensure publication dates come from the files."""
+        call_command('importcsv', silent=True, batch_size=10)
+        with open(
+            os.path.join('static', 'data', 'review.csv'),
+            encoding='utf-8',
+        ) as f:
+            row = next(csv.DictReader(f))
+        self.assertEqual(
+            Review.objects.get(pk=row['id']).pub_date,
+            datetime.fromisoformat(row['pub_date'].replace('Z', '+00:00')),
+        )
+        self.assertTrue(Review._meta.get_field('pub_date').auto_now_add)
+
+    def test_import_dependencies(self):
+        """Ensure files are ordered by the foreign keys of their models."""
+        dependencies = get_dependencies(DATA)
+        self.assertEqual(dependencies[Category], set())
+        self.assertEqual(dependencies[User], set())
+        self.assertEqual(dependencies[TitleGenre], {Title, Genre})
+        self.assertEqual(dependencies[Comment], {Review, User})
+
+
+class CatalogCacheTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin, cls.admin_client = (
+            mixer.blend(User, role='admin'),
+            APIClient(),
+        )
+        cls.admin_client.force_authenticate(cls.admin)
+        cls.title = mixer.blend(Title)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_anonymous_list_is_cached(self):
+        """Ensure repeated anonymous list requests skip the database."""
+        url = reverse('api:title-list')
+        first = self.client.get(url, {'year': self.title.year})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'year': self.title.year})
+        self.assertEqual(first.json(), second.json())
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                url,
+                {'year': self.title.year},
+                HTTP_IF_NONE_MATCH=first['ETag'],
+            )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.admin_client.get(reverse('api:cache-stats'))
+        self.assertEqual(response.json(), {'hits': 2, 'misses': 1})
+
+    def test_etags_match_across_processes(self):
+        """Ensure versions of a local cache do not change ETags."""
+        url = reverse('api:title-detail', args=(self.title.pk,))
+        etag = self.client.get(url)['ETag']
+        # Another worker has its own, newer versions.
+        get_cache().clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cache_is_invalidated(self):
+        """Ensure catalog changes are visible in cached lists."""
+        url = reverse('api:category-list')
+        self.assertEqual(self.client.get(url).json()['count'], 1)
+        mixer.blend(Category)
+        self.assertEqual(self.client.get(url).json()['count'], 2)
+        url = reverse('api:title-list')
+        self.assertIsNone(self.client.get(url).json()['results'][0]['rating'])
+        mixer.blend(Review, title=self.title, score=5)
+        Title.objects.update_ratings()
+        self.assertEqual(
+            self.client.get(url).json()['results'][0]['rating'], 5
+        )
+
+    def test_cant_get_cache_stats_anonymous(self):
+        response = self.client.get(reverse('api:cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ConditionalRequestTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.user_client = mixer.blend(User), APIClient()
+        cls.user_client.force_authenticate(cls.user)
+        cls.title = mixer.blend(Title)
+        cls.review = mixer.blend(Review, title=cls.title)
+
+    def assertNotModified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        return response['ETag']
+
+    def test_title_not_modified(self):
+        """Ensure unchanged titles are answered with 304."""
+        self.assertNotModified(reverse('api:title-list'))
+        url = reverse('api:title-detail', args=(self.title.pk,))
+        etag = self.assertNotModified(url)
+        self.title.name = 'Тигры'
+        self.title.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reviews_modified_on_new_review(self):
+        """Ensure a new review changes the review list ETag."""
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        etag = self.assertNotModified(url)
+        self.user_client.post(url, {'text': 'Ок', 'score': 5}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_comments_modified_on_edit(self):
+        """Ensure an edited comment changes the comment ETag."""
+        comment = mixer.blend(Comment, review=self.review)
+        url = reverse(
+            'api:comments-detail',
+            args=(self.title.pk, self.review.pk, comment.pk),
+        )
+        etag = self.assertNotModified(url)
+        comment.text = 'Исправлено'
+        comment.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['text'], comment.text)
+
+    def test_changes_of_other_processes(self):
+        """Ensure ETags follow the data, not only the local cache."""
+        urls = (
+            reverse('api:title-detail', args=(self.title.pk,)),
+            reverse('api:reviews-list', args=(self.title.pk,)),
+        )
+        etags = [self.assertNotModified(url) for url in urls]
+        # Updates skip the signals which bump the local cache versions.
+        Title.objects.filter(pk=self.title.pk).update(
+            name='Львы',
+            updated=timezone.now(),
+        )
+        Review.objects.filter(pk=self.review.pk).update(
+            text='Исправлено',
+            updated=timezone.now(),
+        )
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_nested_changes_touch_titles(self):
+        """Ensure genre and category changes mark their titles updated."""
+        genre, category = mixer.blend(Genre), mixer.blend(Category)
+        title = mixer.blend(Title, category=category)
+        updates = [title.updated]
+        title.genre.set([genre])
+        for obj in (genre, category):
+            title.refresh_from_db()
+            updates.append(title.updated)
+            obj.name = 'Новое имя'
+            obj.save()
+        title.refresh_from_db()
+        updates.append(title.updated)
+        self.assertEqual(updates, sorted(set(updates)))
+
+
+class CursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.title = mixer.blend(Title)
+        cls.reviews = mixer.cycle(25).blend(Review, title=cls.title)
+
+    def test_reviews_cursor_pagination(self):
+        """Ensure reviews can be walked with keyset pagination."""
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        response = self.client.get(url, {'pagination': 'cursor'})
+        self.assertNotIn('count', response.json())
+        ids = [review['id'] for review in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        ids += [review['id'] for review in response.json()['results']]
+        self.assertIsNone(response.json()['next'])
+        self.assertCountEqual(ids, [review.pk for review in self.reviews])
+
+    def test_cursor_page_validators(self):
+        """Ensure keyset pages are validated without a count query."""
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'pagination': 'cursor'})
+        self.assertEqual(len(context), 2)
+        self.assertNotIn('COUNT', ' '.join(q['sql'] for q in context))
+        response = self.client.get(
+            url,
+            {'pagination': 'cursor'},
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_reviews_page_number_pagination_by_default(self):
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        self.assertEqual(self.client.get(url).json()['count'], 25)
+
+
+class SeedDataTests(APITestCase):
+    def test_seed_data(self):
+        """Ensure a synthetic dataset can be seeded on top of existing rows."""
+        mixer.blend(Title)
+        call_command(
+            'seeddata',
+            users=5,
+            categories=2,
+            genres=4,
+            titles=10,
+            reviews=3,
+            comments=2,
+            seed=1,
+            silent=True,
+        )
+        self.assertEqual(Title.objects.count(), 11)
+        self.assertEqual(Review.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 60)
+        self.assertEqual(
+            Title.objects.filter(rating_count=3).count(),
+            10,
+        )
+        self.assertEqual(
+            Review.objects.values('pub_date').distinct().count(),
+            30,
+        )
+
+
+class NestedResourceTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.user_client = mixer.blend(User), APIClient()
+        cls.user_client.force_authenticate(cls.user)
+        cls.title, cls.other_title = mixer.cycle(2).blend(Title)
+        cls.review = mixer.blend(Review, title=cls.title, author=cls.user)
+
+    def test_cant_create_second_review(self):
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        response = self.user_client.post(
+            url,
+            {'text': 'Ещё раз', 'score': 5},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json()['non_field_errors'][0],
+            'Вы можете оставить только один отзыв на произведение.',
+        )
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_other_integrity_errors_are_raised(self):
+        """Ensure only the unique review constraint becomes a 400."""
+        url = reverse('api:reviews-list', args=(self.other_title.pk,))
+        with mock.patch.object(
+            ReviewSerializer,
+            'create',
+            side_effect=IntegrityError('NOT NULL constraint failed'),
+        ), self.assertRaises(IntegrityError):
+            self.user_client.post(
+                url,
+                {'text': 'Отзыв', 'score': 5},
+                format='json',
+            )
+
+    def test_cant_get_comments_of_other_title(self):
+        """Ensure the review must belong to the title from the URL."""
+        url = reverse(
+            'api:comments-list',
+            args=(self.other_title.pk, self.review.pk),
+        )
+        self.assertEqual(
+            self.client.get(url).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        response = self.user_client.post(url, {'text': 'Ок'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BenchmarkApiTests(APITestCase):
+    def test_benchmark_report(self):
+        """Ensure the workload covers the API and is reported as JSON."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmarkapi',
+                seed=True,
+                users=5,
+                titles=5,
+                requests=100,
+                json=path,
+                stdout=StringIO(),
+            )
+            with open(path, encoding='utf-8') as f:
+                results = json.load(f)
+        self.assertEqual(results['requests'], 100)
+        for row in results['endpoints'].values():
+            self.assertLessEqual(row['p50'], row['p99'])
+            self.assertIsNotNone(row['queries'])
+            self.assertFalse(
+                [code for code in row['statuses'] if code.startswith('5')],
+            )
+
+
+@override_settings(API_METRICS_ENABLED=True)
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin, cls.admin_client = (
+            mixer.blend(User, role='admin'),
+            APIClient(),
+        )
+        cls.admin_client.force_authenticate(cls.admin)
+        mixer.cycle(3).blend(Title)
+
+    def setUp(self):
+        registry.clear()
+        # Keep JSON lines of requests out of the test output.
+        patcher = mock.patch.object(
+            logging.getLogger('api.metrics'),
+            'handlers',
+            [logging.NullHandler()],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_timing_header(self):
+        """Ensure query count and timings are sent with the response."""
+        with self.assertLogs('api.metrics') as logs:
+            response = self.admin_client.get(reverse('api:title-list'))
+        self.assertIn('db;desc="4 queries"', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'GET api:title-list')
+        self.assertEqual(line['queries'], 4)
+        self.assertGreater(line['serializer'], 0)
+
+    async def test_asgi_request(self):
+        """Ensure requests served under ASGI are recorded as well."""
+        response = await self.async_client.get(reverse('api:title-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('db;desc="4 queries"', response['Server-Timing'])
+        self.assertEqual(
+            registry.snapshot()['GET api:title-list']['queries'],
+            4,
+        )
+
+    def test_metrics_endpoint(self):
+        """Ensure per-route aggregates are available to admins."""
+        for _ in range(2):
+            self.admin_client.get(reverse('api:title-list'))
+        response = self.admin_client.get(reverse('api:metrics'))
+        stats = response.json()['GET api:title-list']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['queries'], 4)
+        self.assertEqual(sum(stats['histogram'].values()), 2)
+
+    def test_cant_get_metrics_anonymous(self):
+        response = self.client.get(reverse('api:metrics'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MetricsDisabledTests(APITestCase):
+    def test_no_server_timing_header(self):
+        response = self.client.get(reverse('api:genre-list'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class SearchTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.other = mixer.blend(
+            Title,
+            name='Хроники',
+            description='Повесть о властелине драконов',
+        )
+        cls.title = mixer.blend(
+            Title,
+            name='Властелин колец',
+            description='Эпос',
+        )
+        mixer.blend(Title, name='Колобок', description='Сказка')
+
+    def setUp(self):
+        get_cache().clear()
+
+    def search(self, query):
+        response = self.client.get(
+            reverse('api:title-list'),
+            {'search': query},
+        )
+        return [title['name'] for title in response.json()['results']]
+
+    def test_prefix_search_is_ranked(self):
+        """Ensure name matches rank above description matches."""
+        self.assertEqual(self.search('власт'), ['Властелин колец', 'Хроники'])
+        self.assertEqual(self.search('ВЛАСТЕЛИН кол'), ['Властелин колец'])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_follows_changes(self):
+        """Ensure edited and deleted titles are reindexed."""
+        Title.objects.filter(pk=self.title.pk).update(name='Хоббит')
+        self.assertEqual(self.search('власт'), ['Хроники'])
+        self.assertEqual(self.search('хобб'), ['Хоббит'])
+        self.other.delete()
+        self.assertEqual(self.search('власт'), [])
+
+    @override_settings(SEARCH_BACKEND='api.search.LikeSearchBackend')
+    def test_like_backend(self):
+        """Ensure the fallback backend requires every term."""
+        self.assertEqual(self.search('елин'), ['Хроники', 'Властелин колец'])
+        self.assertEqual(self.search('елин колец'), ['Властелин колец'])
+
+
+class AsyncViewTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.title = mixer.blend(Title)
+        cls.title.genre.set(mixer.cycle(2).blend(Genre))
+        mixer.cycle(25).blend(Title)
+        cls.review = mixer.blend(Review, title=cls.title, score=7)
+        mixer.cycle(3).blend(Comment, review=cls.review)
+
+    def assertSameResponse(self, name, **kwargs):
+        sync = self.client.get(reverse(f'api:{name}', kwargs=kwargs))
+        url = reverse(f'api:async-{name}', kwargs=kwargs)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(
+            response.json(),
+            json.loads(
+                json.dumps(sync.json()).replace('/v1/', '/v1/async/'),
+            ),
+        )
+
+    def test_responses_match_sync_views(self):
+        """Ensure async endpoints return the same data as sync ones."""
+        title = {'title_id': self.title.pk}
+        review = {**title, 'review_id': self.review.pk}
+        self.assertSameResponse('title-list')
+        self.assertSameResponse('title-detail', pk=self.title.pk)
+        self.assertSameResponse('reviews-list', **title)
+        self.assertSameResponse('reviews-detail', pk=self.review.pk, **title)
+        self.assertSameResponse('comments-list', **review)
+        self.assertSameResponse('title-detail', pk=0)
+        self.assertSameResponse('reviews-list', title_id=0)
+
+    def test_pagination_and_filters(self):
+        url = reverse('api:async-title-list')
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.json()['count'], 26)
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(len(response.json()['results']), 6)
+        self.assertEqual(
+            self.client.get(url, {'page': 3}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertEqual(
+            self.client.get(url, {'year': 'x'}).status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        response = self.client.get(url, {'year': self.title.year})
+        self.assertIn(
+            self.title.pk,
+            [title['id'] for title in response.json()['results']],
+        )
+
+    async def test_async_client(self):
+        """Ensure async endpoints run under the ASGI handler."""
+        url = reverse(
+            'api:async-comments-list',
+            kwargs={'title_id': self.title.pk, 'review_id': self.review.pk},
+        )
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()['count'], 3)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTests(APITestCase):
+    def setUp(self):
+        outbox.stats.clear()
+
+    def test_signup_queues_email(self):
+        """Ensure signup stores the email and the worker sends it."""
+        data = {'username': 'reader', 'email': 'reader@yamdb.fake'}
+        response = self.client.post(reverse('api:signup'), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(outbox.deliver(), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@yamdb.fake'])
+        email = OutboxEmail.objects.get()
+        self.assertIsNotNone(email.sent)
+        self.assertEqual(email.body, '')
+        self.assertEqual(outbox.deliver(), 0)
+
+    def test_worker_starts_with_requests(self):
+        """Ensure emails left from a restart do not wait for a signup."""
+        with mock.patch.object(outbox.worker, 'start') as start:
+            self.client.get(reverse('api:genre-list'))
+        start.assert_called()
+        with mock.patch('threading.Thread') as thread:
+            self.assertFalse(outbox.Worker().start())
+        thread.assert_not_called()
+
+    def test_failed_email_is_retried(self):
+        """Ensure failed deliveries back off and stop after max attempts."""
+        email = outbox.enqueue('Тема', 'Текст', 'reader@yamdb.fake')
+        with override_settings(
+            EMAIL_BACKEND='api.tests.FailingEmailBackend',
+            EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+        ):
+            self.assertEqual(outbox.deliver(), 0)
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertIn('ConnectionRefusedError', email.last_error)
+            self.assertEqual(outbox.deliver(), 0)
+            OutboxEmail.objects.update(send_after=email.created)
+            outbox.deliver()
+            self.assertEqual(outbox.stats.snapshot()['dead'], 1)
+        OutboxEmail.objects.update(send_after=email.created)
+        self.assertEqual(outbox.deliver(), 1)
+
+    def test_outbox_stats(self):
+        mixer.cycle(3).blend(OutboxEmail, sent=None, attempts=0)
+        admin_client = APIClient()
+        admin_client.force_authenticate(mixer.blend(User, role='admin'))
+        url = reverse('api:outbox-stats')
+        self.assertEqual(admin_client.get(url).json()['pending'], 3)
+        outbox.deliver()
+        response = admin_client.get(url).json()
+        self.assertEqual(response['pending'], 0)
+        self.assertEqual(response['delivered'], 3)
+        self.assertIsNotNone(response['latency_p95'])
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Claims are trusted with a cache shared between processes only.
+        cls.cache_dir = tempfile.TemporaryDirectory()
+        cls.shared_cache = override_settings(
+            CACHES={
+                'default': {
+                    'BACKEND': (
+                        'django.core.cache.backends.filebased.FileBasedCache'
+                    ),
+                    'LOCATION': cls.cache_dir.name,
+                },
+            },
+        )
+        cls.shared_cache.enable()
+        super().setUpClass()
+        cls.admin = mixer.blend(User, role='admin')
+        cls.title = mixer.blend(Title)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.shared_cache.disable()
+        cls.cache_dir.cleanup()
+
+    def setUp(self):
+        user_cache.clear()
+
+    def get_client(self, user):
+        response = self.client.post(
+            reverse('api:token'),
+            {
+                'username': user.username,
+                'confirmation_code': default_token_generator.make_token(user),
+            },
+        )
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}'
+        )
+        return client
+
+    def test_permissions_skip_user_query(self):
+        """Ensure role checks are answered from the token."""
+        client = self.get_client(self.admin)
+        with self.assertNumQueries(2):
+            response = client.get(reverse('api:users-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_is_loaded_once_when_needed(self):
+        client = self.get_client(mixer.blend(User, role='user'))
+        url = reverse('api:reviews-list', kwargs={'title_id': self.title.pk})
+        data = {'text': 'Отзыв', 'score': 5}
+        response = client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.data['author'], Review.objects.get().author.username
+        )
+        with self.assertNumQueries(0):
+            client.get(reverse('api:users-me'))
+
+    def test_role_change_revokes_claims(self):
+        """Ensure a demoted admin loses access with the old token."""
+        moderator = mixer.blend(User, role='admin')
+        client = self.get_client(moderator)
+        url = reverse('api:users-list')
+        self.assertEqual(client.get(url).status_code, status.HTTP_200_OK)
+        admin_client = self.get_client(self.admin)
+        response = admin_client.patch(
+            reverse(
+                'api:users-detail', kwargs={'username': moderator.username}
+            ),
+            {'role': 'moderator'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            client.get(url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+    def test_local_cache_loads_user(self):
+        """Ensure claims are not trusted when revocations stay local."""
+        user = mixer.blend(User, role='admin')
+        client = self.get_client(user)
+        # Updates skip the signal, like a change made in another process.
+        User.objects.filter(pk=user.pk).update(role='user')
+        url = reverse('api:users-list')
+        self.assertEqual(client.get(url).status_code, status.HTTP_200_OK)
+        with override_settings(
+            CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                },
+            },
+        ):
+            self.assertEqual(
+                client.get(url).status_code,
+                status.HTTP_403_FORBIDDEN,
+            )
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            user_cache.clear()
+            self.assertEqual(
+                client.get(url).status_code,
+                status.HTTP_401_UNAUTHORIZED,
+            )
+
+
+class BulkTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin_client = APIClient()
+        cls.admin_client.force_authenticate(mixer.blend(User, role='admin'))
+        cls.category = mixer.blend(Category, slug='books')
+        cls.genres = mixer.cycle(2).blend(Genre)
+        cls.url = reverse('api:title-bulk')
+
+    def get_titles(self, count):
+        return [
+            {
+                'name': f'Произведение {num}',
+                'year': 2000,
+                'category': 'books',
+                'genre': [genre.slug for genre in self.genres],
+            }
+            for num in range(count)
+        ]
+
+    def test_bulk_create_titles(self):
+        """Ensure titles are created with per-item results."""
+        titles = self.get_titles(3)
+        titles[1]['category'] = 'films'
+        titles[2]['year'] = 3000
+        response = self.admin_client.post(self.url, titles, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            [201, 400, 400],
+        )
+        self.assertIn('category', response.data[1]['errors'])
+        title = Title.objects.get()
+        self.assertEqual(response.data[0]['data']['id'], title.pk)
+        self.assertEqual(title.genre.count(), 2)
+
+    def test_bulk_queries_do_not_grow(self):
+        """Ensure the number of queries does not depend on item count."""
+        with self.assertNumQueries(8):
+            response = self.admin_client.post(
+                self.url,
+                self.get_titles(2),
+                format='json',
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(8):
+            self.admin_client.post(
+                self.url, self.get_titles(20), format='json'
+            )
+        self.assertEqual(Title.objects.count(), 22)
+
+    def test_bulk_update_and_delete_titles(self):
+        first, second = mixer.cycle(2).blend(Title, category=self.category)
+        data = [
+            {'id': first.pk, 'name': 'Новое', 'genre': [self.genres[0].slug]},
+            {'id': 0, 'name': 'Нет такого'},
+        ]
+        response = self.admin_client.patch(self.url, data, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            [200, 404],
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.name, 'Новое')
+        self.assertEqual(list(first.genre.all()), [self.genres[0]])
+        response = self.admin_client.delete(
+            self.url,
+            [second.pk, 0],
+            format='json',
+        )
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            [204, 404],
+        )
+        self.assertEqual(list(Title.objects.all()), [first])
+
+    def test_bulk_invalid_lookups(self):
+        """Ensure lookup values of a wrong type fail per item."""
+        title = mixer.blend(Title, category=self.category)
+        response = self.admin_client.patch(
+            self.url,
+            [{'id': 'abc', 'name': 'Новое'}, {'id': title.pk, 'year': 1999}],
+            format='json',
+        )
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            [400, 200],
+        )
+        self.assertIn('id', response.data[0]['errors'])
+        for invalid in ('abc', {'id': title.pk}):
+            response = self.admin_client.delete(
+                self.url,
+                [invalid, title.pk],
+                format='json',
+            )
+            self.assertEqual(
+                [result['status'] for result in response.data],
+                [400, 204],
+            )
+            title = mixer.blend(Title, category=self.category)
+        self.assertEqual(Title.objects.count(), 1)
+
+    def test_bulk_create_categories_unique_slug(self):
+        data = [
+            {'name': 'Книги', 'slug': 'books'},
+            {'name': 'Фильмы', 'slug': 'films'},
+            {'name': 'Кино', 'slug': 'films'},
+        ]
+        response = self.admin_client.post(
+            reverse('api:category-bulk'),
+            data,
+            format='json',
+        )
+        self.assertEqual(
+            [result['status'] for result in response.data],
+            [400, 201, 400],
+        )
+        self.assertIn('slug', response.data[0]['errors'])
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_bulk_rename_touches_titles(self):
+        """Ensure bulk renames mark titles of the renamed objects updated."""
+        title = mixer.blend(Title, category=self.category)
+        title.genre.set(self.genres[:1])
+        other = mixer.blend(Title)
+        for name, obj in (
+            ('category', self.category),
+            ('genre', self.genres[0]),
+        ):
+            Title.objects.update(updated=timezone.now() - timedelta(days=1))
+            before = Title.objects.get(pk=title.pk).updated
+            response = self.admin_client.patch(
+                reverse(f'api:{name}-bulk'),
+                [{'slug': obj.slug, 'name': 'Новое имя'}],
+                format='json',
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertGreater(Title.objects.get(pk=title.pk).updated, before)
+        self.assertEqual(Title.objects.get(pk=other.pk).updated, before)
+
+    def test_cant_bulk_create_anonymous(self):
+        response = self.client.post(
+            self.url, self.get_titles(1), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('importcsv', silent=True)
+        cls.admin_client = APIClient()
+        User.objects.filter(pk=100).update(role='admin')
+        cls.admin_client.force_authenticate(User.objects.get(pk=100))
+
+    def get_content(self, name):
+        response = self.admin_client.get(
+            reverse('api:export', kwargs={'name': name}),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_titles(self):
+        """Ensure titles are streamed with genres, rating and reviews."""
+        lines = self.get_content('titles.ndjson').splitlines()
+        self.assertEqual(len(lines), Title.objects.count())
+        title = json.loads(lines[0])
+        self.assertEqual(title['rating'], 10)
+        self.assertEqual(
+            title['genre'],
+            list(
+                Title.objects.get(pk=1)
+                .genre.order_by('id')
+                .values_list('slug', flat=True),
+            ),
+        )
+        self.assertEqual(
+            [review['id'] for review in title['reviews']],
+            list(
+                Review.objects.filter(title_id=1)
+                .order_by('id')
+                .values_list('id', flat=True),
+            ),
+        )
+
+    def test_export_csv(self):
+        content = self.get_content('genre.csv')
+        with open(
+            os.path.join('static', 'data', 'genre.csv'),
+            encoding='utf-8',
+        ) as f:
+            self.assertEqual(content.splitlines(), f.read().splitlines())
+
+    def test_export_command_round_trip(self):
+        """Ensure exported files can be imported back."""
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'exportcsv',
+                silent=True,
+                directory=directory,
+                chunk_size=10,
+            )
+            Review.objects.all().delete()
+            call_command('importcsv', silent=True, directory=directory)
+        self.assertEqual(Review.objects.count(), 72)
+        self.assertEqual(Title.objects.get(pk=1).rating, 10)
+
+    def test_cant_export_anonymous(self):
+        url = reverse('api:export', kwargs={'name': 'users.csv'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class FacetTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        drama, comedy = mixer.cycle(2).blend(
+            Genre, slug=mixer.sequence('drama', 'comedy')
+        )
+        books = mixer.blend(Category, slug='books')
+        for year, genres in (
+            (1994, [drama]),
+            (1999, [drama, comedy]),
+            (2005, [comedy]),
+        ):
+            title = mixer.blend(Title, year=year, category=books)
+            title.genre.set(genres)
+        mixer.blend(Title, year=2001, category=None)
+
+    def test_facets(self):
+        """Ensure facet counts cover every title of the list."""
+        response = self.client.get(reverse('api:title-list'), {'facets': '1'})
+        self.assertEqual(
+            response.json()['facets'],
+            {
+                'genre': {'comedy': 2, 'drama': 2},
+                'category': {'books': 3},
+                'year': {'1990-1999': 2, '2000-2009': 2},
+            },
+        )
+
+    def test_facets_follow_filters(self):
+        response = self.client.get(
+            reverse('api:title-list'),
+            {'genre': 'comedy', 'facets': 'genre,year'},
+        )
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(
+            response.json()['facets'],
+            {
+                'genre': {'comedy': 2, 'drama': 1},
+                'year': {'1990-1999': 1, '2000-2009': 1},
+            },
+        )
+
+    def test_no_facets_by_default(self):
+        response = self.client.get(reverse('api:title-list'))
+        self.assertNotIn('facets', response.json())
+
+
+class RankingTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.drama = mixer.blend(Genre, slug='drama')
+        cls.books = mixer.blend(Category, slug='books')
+        cls.single, cls.popular, cls.weak, cls.new = mixer.cycle(4).blend(
+            Title,
+            year=mixer.sequence(1990, 2000, 2000, 2010),
+            category=cls.books,
+        )
+        cls.popular.genre.set([cls.drama])
+        mixer.blend(Review, title=cls.single, score=10)
+        mixer.cycle(20).blend(Review, title=cls.popular, score=9)
+        mixer.cycle(20).blend(Review, title=cls.weak, score=5)
+        Review.objects.exclude(title=cls.single).update(
+            pub_date=timezone.now() - timedelta(days=30),
+        )
+        Title.objects.update_ratings()
+        call_command('refreshrankings', stdout=StringIO())
+        cls.user, cls.user_client = mixer.blend(User), APIClient()
+        cls.user_client.force_authenticate(cls.user)
+
+    def get_ids(self, name, params=None):
+        response = self.client.get(reverse(f'api:title-{name}'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [title['id'] for title in response.json()['results']]
+
+    def test_top(self):
+        """Ensure few high scores do not outrank many good ones."""
+        self.assertEqual(
+            self.get_ids('top'),
+            [self.popular.pk, self.single.pk, self.weak.pk],
+        )
+        response = self.client.get(reverse('api:title-top'))
+        self.assertAlmostEqual(
+            response.json()['results'][0]['score'],
+            (180 + 5 * 290 / 41) / 25,
+        )
+
+    def test_trending(self):
+        """Ensure only titles with recent reviews are trending."""
+        self.assertEqual(self.get_ids('trending'), [self.single.pk])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.get_ids('top', {'genre': 'drama'}),
+            [self.popular.pk],
+        )
+        self.assertEqual(
+            self.get_ids('top', {'year': 2000}),
+            [self.popular.pk, self.weak.pk],
+        )
+        self.assertEqual(
+            len(self.get_ids('top', {'category': 'books'})),
+            3,
+        )
+
+    def test_refresh_upserts(self):
+        """Ensure refreshes update rows in place of recreating them."""
+        TitleRanking.objects.filter(title=self.weak).update(top_score=0)
+        with CaptureQueriesContext(connection) as context:
+            TitleRanking.objects.refresh([self.weak.pk, self.new.pk])
+        self.assertIn(
+            'ON CONFLICT',
+            ' '.join(query['sql'] for query in context.captured_queries),
+        )
+        self.assertGreater(
+            TitleRanking.objects.get(title=self.weak).top_score,
+            0,
+        )
+        Title.objects.filter(pk=self.weak.pk).update(
+            rating_sum=0,
+            rating_count=0,
+        )
+        TitleRanking.objects.refresh([self.weak.pk])
+        self.assertFalse(TitleRanking.objects.filter(title=self.weak).exists())
+
+    def test_cursor_pagination(self):
+        """Ensure leaderboard pages are read without counting rows."""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api:title-top'))
+        self.assertNotIn('count', response.json())
+        self.assertIn('next', response.json())
+
+    def test_review_refreshes_ranking(self):
+        """Ensure review changes through the API update their title."""
+        url = reverse('api:reviews-list', args=(self.new.pk,))
+        response = self.user_client.post(
+            url,
+            {'text': 'Отлично', 'score': 10},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(self.new.pk, self.get_ids('trending'))
+        ranking = TitleRanking.objects.get(title=self.new)
+        self.assertAlmostEqual(ranking.top_score, (10 + 5 * 290 / 41) / 6)
+        url = reverse(
+            'api:reviews-detail',
+            args=(self.new.pk, response.json()['id']),
+        )
+        self.user_client.delete(url)
+        self.assertNotIn(self.new.pk, self.get_ids('top'))
+
+
+class RendererTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin, cls.admin_client = (
+            mixer.blend(User, role='admin'),
+            APIClient(),
+        )
+        cls.admin_client.force_authenticate(cls.admin)
+        cls.title = mixer.blend(Title, name='Сталкер')
+        cls.title.genre.set(mixer.cycle(2).blend(Genre))
+        mixer.cycle(3).blend(Review, title=cls.title, text='Шедевр')
+
+    def test_same_output_as_drf(self):
+        """Ensure orjson renders pages byte for byte like DRF."""
+        for url in (
+            reverse('api:title-list'),
+            reverse('api:reviews-list', args=(self.title.pk,)),
+        ):
+            response = self.client.get(url)
+            self.assertEqual(
+                response.content,
+                JSONRenderer().render(response.data),
+            )
+
+    def test_parse_json(self):
+        response = self.admin_client.post(
+            reverse('api:genre-list'),
+            data='{"name": "Драма", "slug": "drama"}',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['name'], 'Драма')
+        response = self.admin_client.post(
+            reverse('api:genre-list'),
+            data='{"name": ',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(renderers.msgpack, 'msgpack is not installed')
+    def test_msgpack(self):
+        url = reverse('api:title-detail', args=(self.title.pk,))
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(
+            renderers.msgpack.unpackb(response.content)['name'],
+            'Сталкер',
+        )
+
+    def test_benchmark(self):
+        out = StringIO()
+        call_command('benchmarkrenderers', repeat=2, stdout=out)
+        self.assertIn('orjson', out.getvalue())
+
+
+class AdminTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.superuser = mixer.blend(User, is_staff=True, is_superuser=True)
+        cls.genres = mixer.cycle(3).blend(Genre)
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def add_titles(self, count):
+        for title in mixer.cycle(count).blend(
+            Title,
+            category=mixer.blend(Category),
+        ):
+            title.genre.set(self.genres)
+
+    def get_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('admin:reviews_title_changelist'),
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context)
+
+    def test_title_changelist_queries(self):
+        """Ensure genres and categories are not fetched row by row."""
+        self.add_titles(2)
+        queries = self.get_queries()
+        self.add_titles(10)
+        self.assertEqual(self.get_queries(), queries)
+
+    def test_estimated_count(self):
+        """Ensure counts stop at the limit and fall back to estimates."""
+        self.add_titles(5)
+        Title.objects.filter(pk=Title.objects.order_by('pk')[0].pk).delete()
+        paginator = EstimatedCountPaginator(Title.objects.all(), 2)
+        paginator.exact_limit = 2
+        self.assertEqual(paginator.count, Title.objects.last().pk)
+        paginator = EstimatedCountPaginator(
+            Title.objects.filter(year__gte=0),
+            2,
+        )
+        paginator.exact_limit = 2
+        self.assertEqual(paginator.count, 3)
+        paginator = EstimatedCountPaginator(Title.objects.all(), 2)
+        self.assertEqual(paginator.count, 4)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaTests(APITransactionTestCase):
+    """Use a second SQLite file as a replica copied from the primary."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings['replica'] = connections.configure_settings(
+            {
+                'default': connections.settings['default'],
+                'replica': {
+                    'ENGINE': 'django.db.backends.sqlite3',
+                    'NAME': os.path.join(directory.name, 'replica.sqlite3'),
+                },
+            },
+        )['replica']
+        self.addCleanup(self.remove_replica)
+        self.admin = mixer.blend(User, role='admin')
+        self.admin_client = APIClient()
+        self.admin_client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {get_token(self.admin)}',
+        )
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(mixer.blend(User))
+        mixer.blend(Genre, slug='drama')
+        call_command('syncreplicas', stdout=StringIO())
+
+    def remove_replica(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def get_count(self, client):
+        response = client.get(reverse('api:genre-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['count']
+
+    def test_reads_use_replica(self):
+        """Ensure safe requests read from the replica."""
+        mixer.blend(Genre, slug='comedy')
+        self.assertEqual(self.get_count(self.reader_client), 1)
+        self.assertEqual(Genre.objects.count(), 2)
+
+    def test_one_replica_per_request(self):
+        """Ensure all reads of a request use one chosen replica."""
+        mixer.blend(Genre, slug='comedy')
+        with mock.patch('random.choice', return_value='replica') as choice:
+            # The count and the page are two reads.
+            self.assertEqual(self.get_count(self.reader_client), 1)
+        choice.assert_called_once_with(['replica'])
+
+    async def test_asgi_requests(self):
+        """Ensure replica reads and pins work under ASGI."""
+        await sync_to_async(mixer.blend)(Genre, slug='comedy')
+        headers = {'Authorization': f'Bearer {get_token(self.admin)}'}
+        # Anonymous lists are cached from the primary.
+        response = await self.async_client.get(
+            reverse('api:genre-list'),
+            headers=headers,
+        )
+        self.assertEqual(response.json()['count'], 1)
+        response = await self.async_client.post(
+            reverse('api:genre-list'),
+            {'name': 'Мюзикл', 'slug': 'musical'},
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(cache.get(pin_key(self.admin.pk)))
+
+    def test_read_your_writes(self):
+        """Ensure a client reads from the primary right after writing."""
+        response = self.admin_client.post(
+            reverse('api:genre-list'),
+            {'name': 'Комедия', 'slug': 'comedy'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.get_count(self.admin_client), 2)
+        self.assertEqual(self.get_count(self.reader_client), 1)
+        # Token clients rarely keep cookies, their user is pinned.
+        del self.admin_client.cookies[PIN_COOKIE]
+        self.assertEqual(self.get_count(self.admin_client), 2)
+        cache.delete(pin_key(self.admin.pk))
+        self.assertEqual(self.get_count(self.admin_client), 1)
+
+    def test_cached_lists_use_primary(self):
+        """Ensure replica reads never end up in the shared list cache."""
+        mixer.blend(Genre, slug='comedy')
+        self.assertEqual(self.get_count(self.client), 2)
+        self.assertEqual(self.get_count(self.client), 2)
+
+
+class SQLiteProfileTests(APITestCase):
+    def test_init_command(self):
+        """Ensure connections run the configured PRAGMAs."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -64000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class BenchmarkConcurrencyTests(APITransactionTestCase):
+    def test_benchmark_report(self):
+        mixer.cycle(3).blend(Title)
+        out = StringIO()
+        call_command(
+            'benchmarkconcurrency',
+            requests=20,
+            threads=1,
+            writes=50,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[0] for line in lines[1:]], ['stock', 'tuned']
+        )
+        for line in lines[1:]:
+            self.assertIn('200x10 201x10', line)
+
+
+@override_settings(THROTTLE_ENABLED=True)
+class ThrottleTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin, cls.admin_client = (
+            mixer.blend(User, role='admin'),
+            APIClient(),
+        )
+        cls.admin_client.force_authenticate(cls.admin)
+
+    def setUp(self):
+        throttling.local_buckets.clear()
+        throttling.stats.clear()
+
+    def get_token(self, username, ip='10.0.0.1'):
+        return self.client.post(
+            reverse('api:token'),
+            {'username': username, 'confirmation_code': 'wrong'},
+            REMOTE_ADDR=ip,
+        )
+
+    def test_auth_per_ip(self):
+        """Ensure auth attempts of one IP are limited to the rate."""
+        for num in range(10):
+            response = self.get_token(f'user{num}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.get_token('user10')
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        self.assertEqual(response['Retry-After'], '6')
+        response = self.get_token('user10', ip='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_forwarded_for_is_not_trusted(self):
+        """Ensure spoofed X-Forwarded-For headers do not reset limits."""
+        for num in range(11):
+            response = self.client.post(
+                reverse('api:token'),
+                {'username': f'user{num}', 'confirmation_code': 'wrong'},
+                REMOTE_ADDR='10.0.3.1',
+                HTTP_X_FORWARDED_FOR=f'192.0.2.{num}',
+            )
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+
+    def test_auth_per_username(self):
+        """Ensure changing IPs does not help guessing one user's code."""
+        for num in range(5):
+            self.get_token('victim', ip=f'10.0.1.{num}')
+        response = self.get_token('Victim', ip='10.0.1.99')
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        response = self.admin_client.get(reverse('api:throttle-stats'))
+        self.assertEqual(response.json(), {'throttled': {'auth_user': 1}})
+
+    @mock.patch.dict(
+        throttling.WriteRateThrottle.THROTTLE_RATES,
+        {'write': '2/min'},
+    )
+    def test_writes_per_user(self):
+        url = reverse('api:genre-list')
+        for num in range(2):
+            response = self.admin_client.post(
+                url,
+                {'name': 'Жанр', 'slug': f'genre-{num}'},
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.admin_client.post(url, {'name': 'Жанр', 'slug': 'x'})
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(
+            self.admin_client.get(url).status_code,
+            status.HTTP_200_OK,
+        )
+        other = APIClient()
+        other.force_authenticate(mixer.blend(User, role='admin'))
+        response = other.post(url, {'name': 'Жанр', 'slug': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        for num in range(11):
+            response = self.get_token(f'user{num}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(THROTTLE_CACHE_ALIAS='default')
+    def test_shared_buckets(self):
+        """Ensure buckets kept in a cache backend limit requests too."""
+        for num in range(10):
+            self.get_token(f'shared{num}', ip='10.0.2.1')
+        response = self.get_token('shared10', ip='10.0.2.1')
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+        self.assertFalse(throttling.local_buckets.buckets)
+
+    def test_refill(self):
+        """Ensure tokens come back at the rate, up to the capacity."""
+        buckets = throttling.LocalBuckets()
+        for _ in range(2):
+            self.assertEqual(buckets.take('key', 2, 0.5, now=0), 0)
+        self.assertEqual(buckets.take('key', 2, 0.5, now=1), 1)
+        self.assertEqual(buckets.take('key', 2, 0.5, now=2), 0)
+        self.assertEqual(buckets.take('key', 2, 0.5, now=100), 0)
+        self.assertEqual(buckets.take('key', 2, 0.5, now=100), 0)
+        self.assertEqual(buckets.take('key', 2, 0.5, now=100), 2)
+
+
+class SparseFieldsTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.title = mixer.blend(
+            Title,
+            category=mixer.blend(Category, slug='films'),
+        )
+        cls.title.genre.set(
+            mixer.cycle(2).blend(Genre, slug=mixer.sequence('noir', 'epic')),
+        )
+        cls.author = mixer.blend(User, username='critic', bio='Пишет')
+        cls.review = mixer.blend(Review, title=cls.title, author=cls.author)
+        cls.url = reverse('api:title-detail', args=(cls.title.pk,))
+
+    def test_default_output(self):
+        """Ensure titles are nested as before without parameters."""
+        title = self.client.get(self.url).json()
+        self.assertEqual(title['category']['slug'], 'films')
+        self.assertEqual(
+            {genre['slug'] for genre in title['genre']},
+            {'noir', 'epic'},
+        )
+
+    def test_fields(self):
+        """Ensure only requested fields are loaded and returned."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'fields': 'id,rating'})
+        self.assertEqual(
+            response.json(),
+            {'id': self.title.pk, 'rating': self.title.rating},
+        )
+        self.assertEqual(len(context), 2)
+        self.assertNotIn('description', context[1]['sql'])
+
+    def test_compact_relations(self):
+        """Ensure relations left out of `expand` are slugs."""
+        response = self.client.get(
+            self.url,
+            {'fields': 'category,genre', 'expand': 'genre'},
+        )
+        title = response.json()
+        self.assertEqual(title['category'], 'films')
+        self.assertEqual(
+            {genre['slug'] for genre in title['genre']},
+            {'noir', 'epic'},
+        )
+        response = self.client.get(reverse('api:title-list'), {'expand': ''})
+        self.assertEqual(
+            set(response.json()['results'][0]['genre']),
+            {'noir', 'epic'},
+        )
+
+    def test_expand_author(self):
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        response = self.client.get(url, {'fields': 'id,author'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.review.pk, 'author': 'critic'}],
+        )
+        response = self.client.get(url, {'expand': 'author'})
+        self.assertEqual(
+            response.json()['results'][0]['author'],
+            {
+                'username': 'critic',
+                'first_name': self.author.first_name,
+                'last_name': self.author.last_name,
+                'bio': 'Пишет',
+            },
+        )
+
+    def test_fields_with_validators(self):
+        """Ensure columns of ETags are loaded with sparse fieldsets."""
+        mixer.cycle(5).blend(Review, title=self.title)
+        url = reverse('api:reviews-list', args=(self.title.pk,))
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                url,
+                {'pagination': 'cursor', 'fields': 'text'},
+            )
+        self.assertEqual(len(response.json()['results']), 6)
+        Title.objects.update_ratings()
+        TitleRanking.objects.refresh()
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('api:title-top'),
+                {'fields': 'id,name'},
+            )
+        self.assertEqual(response.json()['results'][0]['id'], self.title.pk)
+
+    def test_unknown_names(self):
+        for params in ({'fields': 'id,secret'}, {'expand': 'rating'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(
+                response.status_code,
+                status.HTTP_400_BAD_REQUEST,
+            )
@@ -0,0 +1,171 @@
+import hashlib
+import threading
+from collections import Counter
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LocalBuckets:
+    """
+    Token buckets of this process.
+
+    Buckets that refilled completely are dropped once there are more
+    than `max_size` of them, a full bucket is the same as a missing one.
+    """
+
+    max_size = 100000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key, capacity, rate, now):
+        """Take a token, return 0 or seconds until one is available."""
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self.buckets) > self.max_size:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        self.buckets = {
+            key: bucket
+            for key, bucket in self.buckets.items()
+            if bucket[2] > now
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class CacheBuckets:
+    """
+    Token buckets shared through a cache backend.
+
+    Reading and writing a bucket are two cache calls, so concurrent
+    requests of one client in different processes may both pass.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, capacity, rate, now):
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / rate
+        if not wait:
+            tokens -= 1
+        self.cache.set(key, (tokens, now), int(capacity / rate) + 1)
+        return wait
+
+
+local_buckets = LocalBuckets()
+
+
+def get_buckets():
+    if settings.THROTTLE_CACHE_ALIAS is None:
+        return local_buckets
+    return CacheBuckets(caches[settings.THROTTLE_CACHE_ALIAS])
+
+
+class Stats:
+    """Throttled requests of this process by scope."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.throttled = Counter()
+
+    def add(self, scope):
+        with self.lock:
+            self.throttled[scope] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {'throttled': dict(self.throttled)}
+
+    def clear(self):
+        with self.lock:
+            self.throttled.clear()
+
+
+stats = Stats()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Throttle with a token bucket per client of the scope.
+
+    The rate of the scope in `DEFAULT_THROTTLE_RATES` sets the size of
+    the bucket and how fast it refills, so a client may send a burst of
+    the whole rate, then one request as soon as a token is back. Checks
+    are skipped unless `THROTTLE_ENABLED` is set.
+    """
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED or self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        self.delay = get_buckets().take(
+            key,
+            self.num_requests,
+            self.num_requests / self.duration,
+            self.timer(),
+        )
+        if self.delay:
+            stats.add(self.scope)
+        return not self.delay
+
+    def make_key(self, ident):
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def wait(self):
+        return self.delay
+
+
+class AuthRateThrottle(TokenBucketThrottle):
+    """Auth requests per client IP."""
+
+    scope = 'auth'
+
+    def get_cache_key(self, request, view):
+        return self.make_key(self.get_ident(request))
+
+
+class AuthUsernameThrottle(TokenBucketThrottle):
+    """Auth requests per username, whatever IP they come from."""
+
+    scope = 'auth_user'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        username = data.get('username') if isinstance(data, Mapping) else None
+        if not isinstance(username, str) or not username:
+            return None
+        return self.make_key(
+            hashlib.md5(username.lower().encode()).hexdigest(),
+        )
+
+
+class WriteRateThrottle(TokenBucketThrottle):
+    """Unsafe requests per user, or per IP for anonymous clients."""
+
+    scope = 'write'
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        if request.user and request.user.is_authenticated:
+            return self.make_key(f'user{request.user.pk}')
+        return self.make_key(self.get_ident(request))
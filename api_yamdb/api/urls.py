@@ -1,9 +1,19 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from api.async_views import (
+    AsyncCommentView,
+    AsyncReviewView,
+    AsyncTitleView,
+)
 from api.views import (
+    APICacheStats,
+    APIExport,
     APIGetToken,
+    APIMetrics,
+    APIOutboxStats,
     APISignUp,
+    APIThrottleStats,
     CategoryViewSet,
     CommentViewSet,
     GenreViewSet,
@@ -30,8 +40,42 @@ router.register(
 )
 router.register('users', UserViewSet, basename='users')
 
+title = 'v1/async/titles/'
+review = title + '<int:title_id>/reviews/'
+comment = review + '<int:review_id>/comments/'
+async_urlpatterns = [
+    path(title, AsyncTitleView.as_view(), name='async-title-list'),
+    path(
+        title + '<int:pk>/',
+        AsyncTitleView.as_view(),
+        name='async-title-detail',
+    ),
+    path(review, AsyncReviewView.as_view(), name='async-reviews-list'),
+    path(
+        review + '<int:pk>/',
+        AsyncReviewView.as_view(),
+        name='async-reviews-detail',
+    ),
+    path(comment, AsyncCommentView.as_view(), name='async-comments-list'),
+    path(
+        comment + '<int:pk>/',
+        AsyncCommentView.as_view(),
+        name='async-comments-detail',
+    ),
+]
+
 urlpatterns = [
     path('v1/auth/token/', APIGetToken.as_view(), name='token'),
     path('v1/auth/signup/', APISignUp.as_view(), name='signup'),
+    path('v1/cache/stats/', APICacheStats.as_view(), name='cache-stats'),
+    path('v1/metrics/', APIMetrics.as_view(), name='metrics'),
+    path('v1/export/<str:name>', APIExport.as_view(), name='export'),
+    path('v1/outbox/stats/', APIOutboxStats.as_view(), name='outbox-stats'),
+    path(
+        'v1/throttle/stats/',
+        APIThrottleStats.as_view(),
+        name='throttle-stats',
+    ),
+    *async_urlpatterns,
     path('v1/', include(router.urls)),
 ]
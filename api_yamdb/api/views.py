@@ -1,17 +1,34 @@
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
-from django.db.models import Avg
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import AccessToken
 
-from api.filters import TitleFilterSet
-from api.mixins import CreateDeleteListViewSet
+from api import export, outbox, throttling
+from api.authentication import get_token
+from api.cache import get_stats
+from api.filters import FACETS, FullTextSearchFilter, TitleFilterSet
+from api.metrics import registry
+from api.mixins import (
+    BulkMixin,
+    CachedListMixin,
+    ConditionalMixin,
+    CreateDeleteListViewSet,
+    CursorPaginationMixin,
+    FacetMixin,
+    SparseFieldsMixin,
+    TimedSerializerMixin,
+)
+from api.pagination import RankingCursorPagination
 from api.permissions import (
     AdminOrReadOnlyPermission,
     AdminPermission,
@@ -21,6 +38,7 @@ from api.serializers import (
     CategorySerializer,
     CommentSerializer,
     GenreSerializer,
+    RankedTitleSerializer,
     ReviewSerializer,
     SignUpSerializer,
     TitleManageSerializer,
@@ -28,39 +46,176 @@ from api.serializers import (
     TokenSerializer,
     UserSerializer,
 )
-from reviews.models import Category, Genre, Review, Title, User
+from reviews.models import (
+    Category,
+    Genre,
+    Review,
+    Title,
+    TitleRanking,
+    User,
+)
+
+# Leaderboard actions of `TitleViewSet` and the scores they order by.
+RANKINGS = {
+    'top': 'ranking__top_score',
+    'trending': 'ranking__trending_score',
+}
 
 
 class CategoryViewSet(CreateDeleteListViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    cache_namespace = 'category'
+    bulk_invalidate = ('category', 'title')
+
+    def write(self, serializers, create):
+        objs = super().write(serializers, create)
+        # bulk_update() sends no post_save to touch the nesting titles.
+        if not create:
+            Title.objects.filter(category__in=objs).touch()
+        return objs
 
 
 class GenreViewSet(CreateDeleteListViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
+    cache_namespace = 'genre'
+    bulk_invalidate = ('genre', 'title')
+
+    def write(self, serializers, create):
+        objs = super().write(serializers, create)
+        # bulk_update() sends no post_save to touch the nesting titles.
+        if not create:
+            Title.objects.filter(genre__in=objs).touch()
+        return objs
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(
+    BulkMixin,
+    CachedListMixin,
+    ConditionalMixin,
+    FacetMixin,
+    SparseFieldsMixin,
+    TimedSerializerMixin,
+    viewsets.ModelViewSet,
+):
     serializer_class = TitleSerializer
+    filter_backends = (DjangoFilterBackend, FullTextSearchFilter)
     filterset_class = TitleFilterSet
+    search_fields = ('name', 'description')
     permission_classes = (AdminOrReadOnlyPermission,)
+    cache_namespace = 'title'
+    conditional_namespace = 'title'
+    conditional_date_field = 'updated'
+    bulk_invalidate = ('title',)
+    facet_names = FACETS
+    sparse_columns = {'rating': ('rating_sum', 'rating_count')}
+    sparse_select_related = {'category': 'slug'}
+    sparse_prefetch_related = {'genre': 'slug'}
+    sparse_default_expand = ('category', 'genre')
+    sparse_required = ('updated',)
 
     def get_queryset(self):
-        return (
-            Title.objects.all()
-            .annotate(rating=Avg('reviews__score'))
-            .order_by('id')
+        queryset = Title.objects.select_related('category').prefetch_related(
+            'genre',
         )
+        field = RANKINGS.get(self.action)
+        if field:
+            # Both keys come from the ranking table, so its index serves
+            # the whole ORDER BY and a page reads page size rows.
+            return queryset.filter(**{f'{field}__gt': 0}).annotate(
+                rank=F(field),
+                rank_id=F('ranking__title_id'),
+            )
+        return queryset.order_by('id')
 
     def get_serializer_class(self):
-        if self.action in ('create', 'update', 'partial_update', 'destroy'):
+        if self.action in (
+            'create',
+            'update',
+            'partial_update',
+            'destroy',
+            'bulk',
+        ):
             return TitleManageSerializer
+        if self.action in RANKINGS:
+            return RankedTitleSerializer
         return super().get_serializer_class()
 
+    @action(detail=False, pagination_class=RankingCursorPagination)
+    def top(self, request, *args, **kwargs):
+        """Titles by rating weighted with their number of reviews."""
+        return self.list(request, *args, **kwargs)
+
+    @action(detail=False, pagination_class=RankingCursorPagination)
+    def trending(self, request, *args, **kwargs):
+        """Titles by scores of recent reviews."""
+        return self.list(request, *args, **kwargs)
+
+
+class APICacheStats(APIView):
+    permission_classes = (AdminPermission,)
+
+    def get(self, request):
+        return Response(get_stats(), status=status.HTTP_200_OK)
+
+
+class APIOutboxStats(APIView):
+    permission_classes = (AdminPermission,)
+
+    def get(self, request):
+        return Response(outbox.stats.snapshot(), status=status.HTTP_200_OK)
+
+
+class APIThrottleStats(APIView):
+    permission_classes = (AdminPermission,)
+
+    def get(self, request):
+        return Response(
+            throttling.stats.snapshot(),
+            status=status.HTTP_200_OK,
+        )
+
+
+class APIExport(APIView):
+    """
+    Streams `titles.ndjson` or a `static/data` CSV file, see `api.export`.
+    """
+
+    permission_classes = (AdminPermission,)
+
+    def get(self, request, name):
+        if name == 'titles.ndjson':
+            lines, content_type = export.iter_titles(), 'application/x-ndjson'
+        elif name in export.COLUMNS:
+            lines, content_type = export.iter_csv(name), 'text/csv'
+        else:
+            raise Http404
+        response = StreamingHttpResponse(
+            export.buffered(lines),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+
+class APIMetrics(APIView):
+    permission_classes = (AdminPermission,)
+
+    def get(self, request):
+        return Response(registry.snapshot(), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        registry.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class APIGetToken(APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (
+        throttling.AuthRateThrottle,
+        throttling.AuthUsernameThrottle,
+    )
 
     def post(self, request):
         serializer = TokenSerializer(data=request.data)
@@ -69,7 +224,7 @@ class APIGetToken(APIView):
         username = serializer.validated_data['username']
         user = get_object_or_404(User, username=username)
         if default_token_generator.check_token(user, confirmation_code):
-            token = AccessToken.for_user(user)
+            token = get_token(user)
             return Response({'token': f'{token}'}, status=status.HTTP_200_OK)
         return Response(
             'Неверный код подтверждения',
@@ -79,6 +234,10 @@ class APIGetToken(APIView):
 
 class APISignUp(APIView):
     permission_classes = (AllowAny,)
+    throttle_classes = (
+        throttling.AuthRateThrottle,
+        throttling.AuthUsernameThrottle,
+    )
 
     def post(self, request):
         serializer = SignUpSerializer(data=request.data)
@@ -89,17 +248,15 @@ class APISignUp(APIView):
             f'Здравствуйте, {user.username}.'
             f'\nВаш код подтверждения: {confirmation_code}'
         )
-        subject = 'Код подтверждения YaMDb'
-        email = EmailMessage(subject=subject, body=message, to=[user.email])
-        email.send()
+        outbox.enqueue('Код подтверждения YaMDb', message, user.email)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(TimedSerializerMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (AdminPermission,)
-    filter_backends = (SearchFilter,)
+    filter_backends = (FullTextSearchFilter,)
     search_fields = ('username',)
     lookup_field = 'username'
     http_method_names = ('get', 'post', 'patch', 'delete')
@@ -111,6 +268,9 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer_class=UserSerializer,
     )
     def me(self, request):
+        if request.method == 'GET':
+            serializer = self.get_serializer(request.user)
+            return Response(serializer.data, status=status.HTTP_200_OK)
         serializer = self.get_serializer(
             request.user,
             data=request.data,
@@ -121,33 +281,96 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(
+    ConditionalMixin,
+    CursorPaginationMixin,
+    SparseFieldsMixin,
+    TimedSerializerMixin,
+    viewsets.ModelViewSet,
+):
     serializer_class = ReviewSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         IsOwnerOrReadOnly,
     ]
+    conditional_namespace = 'review:{title_id}'
+    conditional_date_field = 'updated'
+    sparse_select_related = {'author': 'username'}
+    sparse_required = ('title', 'pub_date', 'updated')
+
+    @cached_property
+    def title(self):
+        return get_object_or_404(Title, id=self.kwargs.get('title_id'))
 
     def get_queryset(self):
-        title = get_object_or_404(Title, id=self.kwargs.get('title_id'))
-        return title.reviews.all()
+        return self.title.reviews.select_related('author')
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        title = get_object_or_404(Title, id=self.kwargs.get('title_id'))
-        serializer.save(author=self.request.user, title=title)
+        # The unique constraint replaces a separate exists() query, which
+        # only runs to tell its violation from other integrity errors.
+        try:
+            with transaction.atomic():
+                review = serializer.save(
+                    author=self.request.user,
+                    title=self.title,
+                )
+        except IntegrityError:
+            if not self.title.reviews.filter(
+                author=self.request.user,
+            ).exists():
+                raise
+            raise ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        serializer.error_messages['unique_review'],
+                    ],
+                },
+            )
+        Title.objects.filter(pk=self.title.pk).change_rating(review.score, 1)
+        TitleRanking.objects.refresh([self.title.pk])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_score = (
+            Review.objects.select_for_update()
+            .values_list('score', flat=True)
+            .get(pk=serializer.instance.pk)
+        )
+        review = serializer.save()
+        Title.objects.filter(pk=review.title_id).change_rating(
+            review.score - old_score,
+        )
+        TitleRanking.objects.refresh([review.title_id])
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(
+    ConditionalMixin,
+    CursorPaginationMixin,
+    SparseFieldsMixin,
+    TimedSerializerMixin,
+    viewsets.ModelViewSet,
+):
     serializer_class = CommentSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         IsOwnerOrReadOnly,
     ]
+    conditional_namespace = 'comment:{review_id}'
+    conditional_date_field = 'updated'
+    sparse_select_related = {'author': 'username'}
+    sparse_required = ('review', 'pub_date', 'updated')
+
+    @cached_property
+    def review(self):
+        return get_object_or_404(
+            Review,
+            id=self.kwargs.get('review_id'),
+            title_id=self.kwargs.get('title_id'),
+        )
 
     def get_queryset(self):
-        review = get_object_or_404(Review, id=self.kwargs.get('review_id'))
-        return review.comments.all()
+        return self.review.comments.select_related('author')
 
     def perform_create(self, serializer):
-        review = get_object_or_404(Review, id=self.kwargs.get('review_id'))
-        serializer.save(author=self.request.user, review=review)
+        serializer.save(author=self.request.user, review=self.review)
@@ -1,5 +1,50 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+AUTO_FIELDS = (models.AutoField, models.BigAutoField, models.SmallAutoField)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that stops counting rows after `exact_limit`.
+
+    Larger unfiltered tables report the planner row estimate on
+    PostgreSQL and the largest auto primary key elsewhere, both read
+    without a table scan. Larger filtered lists are cut at the limit.
+    """
+
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        exact = queryset[: self.exact_limit + 1].count()
+        if exact <= self.exact_limit:
+            return exact
+        return max(self.estimate(queryset) or 0, exact)
+
+    def estimate(self, queryset):
+        if queryset.query.where:
+            return None
+        opts = queryset.model._meta
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [opts.db_table],
+                )
+                row = cursor.fetchone()
+            return int(row[0]) if row else None
+        if isinstance(opts.pk, AUTO_FIELDS):
+            return queryset.aggregate(last=Max('pk'))['last']
+        return None
 
 
 class BaseAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
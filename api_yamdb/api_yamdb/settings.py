@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 from decouple import Csv, config
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
 # fmt: on
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,10 +68,120 @@ WSGI_APPLICATION = 'api_yamdb.wsgi.application'
 
 # Database
 
+# SQLite tuned for several workers: WAL lets reads run next to a write,
+# IMMEDIATE transactions queue writers on `timeout` instead of failing
+# with "database is locked", and connections are kept between requests.
+SQLITE_INIT_COMMAND = ';'.join(
+    (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA cache_size = -64000',
+        'PRAGMA mmap_size = 268435456',
+        'PRAGMA temp_store = MEMORY',
+    ),
+)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'api_yamdb.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': config(
+                'SQLITE_INIT_COMMAND',
+                default=SQLITE_INIT_COMMAND,
+            ),
+        },
+    },
+}
+
+# SQLite files standing in for read replicas of the primary, refreshed
+# with `manage.py syncreplicas`. Any other alias added to DATABASES is
+# used as a replica as well.
+for num, name in enumerate(
+    config('REPLICA_DATABASES', default='', cast=Csv()),
+    start=1,
+):
+    DATABASES[f'replica{num}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Seconds a client reads from the primary after its last write.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+
+# Cache
+
+# Role claims of access tokens are trusted only with a default cache
+# shared by all processes (Redis, Memcached, files), since revocations
+# are kept there. With the local memory default every request loads
+# its user, see `api.authentication`.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+}
+
+CATALOG_CACHE_ALIAS = config('CATALOG_CACHE_ALIAS', default='default')
+CATALOG_CACHE_TIMEOUT = config(
+    'CATALOG_CACHE_TIMEOUT',
+    default=60 * 15,
+    cast=int,
+)
+
+
+# Title rankings
+
+# Reviews a title needs before its own rating outweighs the mean one.
+RANKING_MIN_REVIEWS = config('RANKING_MIN_REVIEWS', default=5, cast=int)
+RANKING_TRENDING_DAYS = config('RANKING_TRENDING_DAYS', default=14, cast=int)
+RANKING_HALF_LIFE_DAYS = config(
+    'RANKING_HALF_LIFE_DAYS',
+    default=3,
+    cast=float,
+)
+RANKING_REFRESH_INTERVAL = config(
+    'RANKING_REFRESH_INTERVAL',
+    default=60 * 60,
+    cast=int,
+)
+
+
+# Search
+
+# Dotted path of an `api.search` backend, the best one for the database
+# is used by default.
+SEARCH_BACKEND = config('SEARCH_BACKEND', default=None)
+
+
+# Request metrics
+
+API_METRICS_ENABLED = config('API_METRICS_ENABLED', default=False, cast=bool)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.metrics': {
+            'handlers': ['console'],
+            'level': config('API_METRICS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
     },
 }
 
@@ -117,13 +230,46 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.WriteRateThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': config('THROTTLE_AUTH_RATE', default='10/min'),
+        'auth_user': config('THROTTLE_AUTH_USER_RATE', default='5/min'),
+        'write': config('THROTTLE_WRITE_RATE', default='60/min'),
+    },
+    # Reverse proxies in front of the app. Client IPs of throttles are
+    # taken from X-Forwarded-For only as far as these proxies set it, so
+    # clients cannot pick their own address with the header.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack is served with `Accept: application/msgpack` when installed.
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'api.renderers.MessagePackRenderer',
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'api.renderers.MessagePackParser',
+    )
+
+# Token buckets are kept in process memory unless a cache is named,
+# which lets several processes share them.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_CACHE_ALIAS = config('THROTTLE_CACHE_ALIAS', default=None)
+
 SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -132,7 +278,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'reviews.User'
 
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=30, cast=int)
+
 # Email
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+
+# Emails are stored in the outbox table and sent by a background thread.
+EMAIL_OUTBOX_WORKER = config('EMAIL_OUTBOX_WORKER', default=True, cast=bool)
+EMAIL_OUTBOX_WORKERS = config('EMAIL_OUTBOX_WORKERS', default=2, cast=int)
+EMAIL_OUTBOX_BATCH_SIZE = config(
+    'EMAIL_OUTBOX_BATCH_SIZE',
+    default=50,
+    cast=int,
+)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config(
+    'EMAIL_OUTBOX_MAX_ATTEMPTS',
+    default=5,
+    cast=int,
+)
+EMAIL_OUTBOX_BACKOFF = config('EMAIL_OUTBOX_BACKOFF', default=30, cast=int)
+EMAIL_OUTBOX_MAX_BACKOFF = config(
+    'EMAIL_OUTBOX_MAX_BACKOFF',
+    default=60 * 60,
+    cast=int,
+)
+EMAIL_OUTBOX_LEASE = config('EMAIL_OUTBOX_LEASE', default=5 * 60, cast=int)
+EMAIL_OUTBOX_POLL_INTERVAL = config(
+    'EMAIL_OUTBOX_POLL_INTERVAL',
+    default=10,
+    cast=int,
+)
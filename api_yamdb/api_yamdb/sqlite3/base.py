@@ -0,0 +1,36 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend with the `init_command` and `transaction_mode` options.
+
+    Both work like in Django 5.1: `init_command` holds statements, such
+    as PRAGMAs, run on every new connection, and `transaction_mode`
+    replaces the default DEFERRED mode of BEGIN. With IMMEDIATE, write
+    transactions take the lock up front and wait up to `timeout` for it,
+    instead of failing with "database is locked" when a read turns into
+    a write.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_commands = [
+            command.strip()
+            for command in params.pop('init_command', '').split(';')
+            if command.strip()
+        ]
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for command in self.init_commands:
+            conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
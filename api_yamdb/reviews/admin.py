@@ -1,23 +1,22 @@
 from django.contrib import admin
 
 from api_yamdb.admin import BaseAdmin
-from reviews.models import Category, Genre, Title, User
+from reviews.models import Category, Genre, OutboxEmail, Title, User
 
 
 @admin.register(Title)
 class TitleAdmin(BaseAdmin):
     list_display = ('pk', 'name', 'year', 'category', 'get_genres')
+    list_select_related = ('category',)
     search_fields = ('name',)
     list_filter = ('year',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('genre')
+
     @admin.display(description='genres')
     def get_genres(self, obj):
-        return [
-            genre[0]
-            for genre in Title.objects.values_list('genre__name').filter(
-                pk=obj.pk,
-            )
-        ]
+        return [genre.name for genre in obj.genre.all()]
 
 
 @admin.register(Genre)
@@ -35,3 +34,12 @@ class UserAdmin(BaseAdmin):
     """Users admin panel"""
 
     list_display = ('username', 'role')
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(BaseAdmin):
+    list_display = ('to', 'subject', 'created', 'attempts', 'sent')
+    list_filter = ('sent',)
+    search_fields = ('to',)
+    # Bodies carry working confirmation codes.
+    exclude = ('body',)
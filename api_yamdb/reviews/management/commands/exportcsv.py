@@ -0,0 +1,69 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import CHUNK_SIZE, COLUMNS, iter_csv
+
+
+class Command(BaseCommand):
+    """
+    Exports tables to CSV files in the format read by `importcsv`.
+
+    Tables are read in primary key order in chunks, with server-side
+    cursors where the database has them, so memory use does not depend
+    on the table size.
+
+    Usage:
+    ```
+    manage.py exportcsv [-s, --silent] [-d, --directory DIR]
+        [-c, --chunk-size N]
+    ```
+    """
+
+    help = 'Exports tables to CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-s',
+            '--silent',
+            action='store_true',
+            help='Hide progress messages.',
+        )
+        parser.add_argument(
+            '-d',
+            '--directory',
+            type=Path,
+            default=Path('export'),
+            help='Directory to write the files to.',
+        )
+        parser.add_argument(
+            '-c',
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Rows fetched from the database at once.',
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be a positive integer.')
+        directory = Path(options['directory'])
+        directory.mkdir(parents=True, exist_ok=True)
+        for filename in COLUMNS:
+            started = time.perf_counter()
+            with open(
+                directory / filename,
+                'w',
+                encoding='utf-8',
+                newline='',
+            ) as f:
+                total = -1
+                for line in iter_csv(filename, options['chunk_size']):
+                    f.write(line)
+                    total += 1
+            if not options['silent']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{filename}: {total} rows in {elapsed:.2f}s',
+                )
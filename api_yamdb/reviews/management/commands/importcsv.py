@@ -1,21 +1,98 @@
 import csv
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from graphlib import TopologicalSorter
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
 
+from api.cache import invalidate
 from api_yamdb.settings import BASE_DIR
 from reviews import models
 
+DATA_DIR = BASE_DIR / 'static' / 'data'
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_JOBS = 4
+
+DATA = (
+    ('category.csv', models.Category, 'Категория'),
+    ('genre.csv', models.Genre, 'Жанр'),
+    ('users.csv', models.User, 'Пользователь'),
+    ('title.csv', models.Title, 'Произведение'),
+    ('title_genre.csv', models.TitleGenre, 'Произведение-жанр'),
+    ('review.csv', models.Review, 'Отзыв'),
+    ('comments.csv', models.Comment, 'Комментарий'),
+)
+
+
+def get_dependencies(data):
+    """Map each imported model to the imported models it references."""
+    imported = {item[1] for item in data}
+    return {
+        model: {
+            field.related_model
+            for field in model._meta.get_fields()
+            if field.many_to_one
+            and field.concrete
+            and field.related_model in imported
+            and field.related_model is not model
+        }
+        for model in imported
+    }
+
+
+def reset_sequence(model):
+    """Move the id sequence past rows inserted with explicit ids."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def bulk_create_keeping_dates(model, objs, names, **options):
+    """
+    Insert `objs`, keeping their values of `auto_now_add` fields in `names`.
+
+    `bulk_create` fills these fields with the insert time, so the given
+    values are written back with one bulk update. Model fields are left
+    as they are, the commands insert from several threads.
+    """
+    fields = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False) and field.name in names
+    ]
+    values = [[getattr(obj, name) for name in fields] for obj in objs]
+    model.objects.bulk_create(objs, **options)
+    if not fields:
+        return
+    for obj, row in zip(objs, values):
+        for name, value in zip(fields, row):
+            if value is not None:
+                setattr(obj, name, value)
+    model.objects.bulk_update(objs, fields)
+
 
 class Command(BaseCommand):
     """
     Imports tables from CSV files.
 
-    Make sure to clear your db before using this command.
+    Rows are streamed in batches into `bulk_create`, one transaction per
+    file. Existing rows with the same id are updated where the database
+    supports upserts and left untouched otherwise.
+
+    Files are loaded in foreign key order. Files that do not depend on
+    each other are loaded concurrently on server databases; SQLite
+    allows a single writer, so there they are loaded one by one.
 
     Usage:
     ```
-    manage.py flush
-    manage.py importcsv [-s, --silent]
+    manage.py importcsv [-s, --silent] [-b, --batch-size N] [-j, --jobs N]
+        [-d, --directory DIR]
     ```
     """
 
@@ -26,26 +103,147 @@ class Command(BaseCommand):
             '-s',
             '--silent',
             action='store_true',
-            help='Hide creation messages.',
+            help='Hide progress messages.',
+        )
+        parser.add_argument(
+            '-b',
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows per INSERT statement.',
+        )
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=DEFAULT_JOBS,
+            help='Files loaded concurrently on server databases.',
+        )
+        parser.add_argument(
+            '-d',
+            '--directory',
+            type=Path,
+            default=DATA_DIR,
+            help='Directory with the CSV files.',
         )
 
     def handle(self, *args, **options):
-        data = (
-            ('category.csv', models.Category, 'Категория'),
-            ('genre.csv', models.Genre, 'Жанр'),
-            ('users.csv', models.User, 'Пользователь'),
-            ('title.csv', models.Title, 'Произведение'),
-            ('title_genre.csv', models.TitleGenre, 'Произведение-жанр'),
-            ('review.csv', models.Review, 'Отзыв'),
-            ('comments.csv', models.Comment, 'Комментарий'),
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size must be a positive integer.')
+        if options['jobs'] < 1:
+            raise CommandError('Jobs must be a positive integer.')
+        sorter = TopologicalSorter(get_dependencies(DATA))
+        files = {item[1]: item for item in DATA}
+        args = (
+            Path(options['directory']),
+            options['batch_size'],
+            options['silent'],
+        )
+        if connection.vendor == 'sqlite' or options['jobs'] == 1:
+            for model in sorter.static_order():
+                self.import_file(*files[model], *args)
+        else:
+            self.import_parallel(sorter, files, args, options['jobs'])
+        models.Title.objects.update_ratings()
+        models.TitleRanking.objects.refresh()
+        invalidate('category', 'genre', 'title')
+
+    def import_parallel(self, sorter, files, args, jobs):
+        """Load files as soon as the files they reference are loaded."""
+        sorter.prepare()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = {}
+            while sorter.is_active():
+                for model in sorter.get_ready():
+                    future = executor.submit(
+                        self.import_worker,
+                        *files[model],
+                        *args,
+                    )
+                    pending[future] = model
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    sorter.done(pending.pop(future))
+
+    def import_worker(self, *args):
+        try:
+            self.import_file(*args)
+        finally:
+            connection.close()
+
+    def import_file(
+        self,
+        filename,
+        model,
+        label,
+        directory,
+        batch_size,
+        silent,
+    ):
+        """Load one CSV file into `model` inside a single transaction."""
+        started = time.perf_counter()
+        total = 0
+        with open(
+            directory / filename,
+            encoding='utf-8',
+        ) as f, transaction.atomic():
+            dreaded = csv.DictReader(f)
+            fields = [name for name in dreaded.fieldnames if name != 'id']
+            id_maps = self.get_id_maps(model, fields)
+            options = self.get_conflict_options(model, fields)
+            while True:
+                rows = list(islice(dreaded, batch_size))
+                if not rows:
+                    break
+                objs = [
+                    self.build(model, row, id_maps, filename, num)
+                    for num, row in enumerate(rows, start=total + 1)
+                ]
+                bulk_create_keeping_dates(model, objs, fields, **options)
+                total += len(objs)
+                if not silent:
+                    self.report(label, total, started)
+            reset_sequence(model)
+        if not silent:
+            self.report(label, total, started, ending='done')
+
+    def get_id_maps(self, model, fields):
+        """Preload primary keys of every model referenced by `fields`."""
+        id_maps = {}
+        for name in fields:
+            field = model._meta.get_field(name)
+            if field.many_to_one:
+                related = field.related_model
+                id_maps[name] = {
+                    str(pk)
+                    for pk in related.objects.values_list('pk', flat=True)
+                }
+        return id_maps
+
+    def get_conflict_options(self, model, fields):
+        features = connection.features
+        if features.supports_update_conflicts_with_target:
+            return {
+                'update_conflicts': True,
+                'unique_fields': (model._meta.pk.name,),
+                'update_fields': fields,
+            }
+        if features.supports_update_conflicts:
+            return {'update_conflicts': True, 'update_fields': fields}
+        return {'ignore_conflicts': True}
+
+    def build(self, model, row, id_maps, filename, num):
+        for name, ids in id_maps.items():
+            if row[name] not in ids:
+                raise CommandError(
+                    f'{filename}, row {num}: unknown {name} `{row[name]}`.',
+                )
+        return model(**row)
+
+    def report(self, label, total, started, ending='...'):
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{label}: {total} rows, {rate:.0f} rows/s {ending}',
         )
-        for item in data:
-            with open(
-                BASE_DIR / 'static' / 'data' / item[0],
-                encoding='utf-8',
-            ) as f:
-                dreaded = csv.DictReader(f)
-                for row in dreaded:
-                    _, created = item[1].objects.update_or_create(**row)
-                    if created and not options['silent']:
-                        print(f'{item[2]} `{_}` has been created.')
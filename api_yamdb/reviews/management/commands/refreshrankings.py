@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate
+from reviews.models import TitleRanking
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the title leaderboards.
+
+    Review changes through the API refresh the ranking of their title
+    only, so run it periodically, or with `--loop` every
+    `RANKING_REFRESH_INTERVAL` seconds, to decay trending scores and
+    follow the catalog mean rating.
+
+    Usage:
+    ```
+    manage.py refreshrankings [--loop]
+    ```
+    """
+
+    help = 'Rebuilds the title leaderboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep refreshing the leaderboards.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            ranked = TitleRanking.objects.refresh()
+            invalidate('title')
+            self.stdout.write(
+                f'Rankings of {ranked} titles have been updated.'
+            )
+            if not options['loop']:
+                break
+            time.sleep(settings.RANKING_REFRESH_INTERVAL)
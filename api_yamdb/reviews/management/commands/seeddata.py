@@ -0,0 +1,198 @@
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import invalidate
+from reviews import models
+from reviews.management.commands.importcsv import (
+    DEFAULT_BATCH_SIZE,
+    bulk_create_keeping_dates,
+    reset_sequence,
+)
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with a synthetic dataset.
+
+    Rows get explicit ids after the current maximum, so the command can
+    be run on top of existing data. Publication dates are spread over
+    the last `--days` days.
+
+    Usage:
+    ```
+    manage.py seeddata [--users N] [--categories N] [--genres N]
+        [--titles N] [--reviews N] [--comments N] [--seed N]
+    ```
+    """
+
+    help = 'Fills the database with a synthetic dataset'
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 100, 'Users to create.'),
+            ('categories', 10, 'Categories to create.'),
+            ('genres', 30, 'Genres to create.'),
+            ('titles', 1000, 'Titles to create.'),
+            ('reviews', 10, 'Reviews per title, at most one per user.'),
+            ('comments', 2, 'Comments per review.'),
+            ('days', 365, 'Days to spread publication dates over.'),
+            ('batch-size', DEFAULT_BATCH_SIZE, 'Rows per INSERT statement.'),
+        ):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=help_text,
+            )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for a reproducible dataset.',
+        )
+        parser.add_argument(
+            '-s',
+            '--silent',
+            action='store_true',
+            help='Hide progress messages.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Batch size must be a positive integer.')
+        if options['users'] < 1 and options['reviews'] > 0:
+            raise CommandError('Reviews and comments need users.')
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        with transaction.atomic():
+            self.seed()
+        models.Title.objects.update_ratings()
+        models.TitleRanking.objects.refresh()
+        invalidate('category', 'genre', 'title')
+
+    def seed(self):
+        rnd, options = self.random, self.options
+        users = self.create(
+            models.User,
+            options['users'],
+            lambda pk, num: models.User(
+                pk=pk,
+                username=f'seed_user_{pk}',
+                email=f'seed_user_{pk}@yamdb.fake',
+            ),
+        )
+        categories = self.create(
+            models.Category,
+            options['categories'],
+            lambda pk, num: models.Category(
+                pk=pk,
+                name=f'Категория {pk}',
+                slug=f'seed-category-{pk}',
+            ),
+        )
+        genres = self.create(
+            models.Genre,
+            options['genres'],
+            lambda pk, num: models.Genre(
+                pk=pk,
+                name=f'Жанр {pk}',
+                slug=f'seed-genre-{pk}',
+            ),
+        )
+        titles = self.create(
+            models.Title,
+            options['titles'],
+            lambda pk, num: models.Title(
+                pk=pk,
+                name=f'Произведение {pk}',
+                year=rnd.randint(1900, self.now.year),
+                description=f'Описание произведения {pk}',
+                category_id=rnd.choice(categories) if categories else None,
+            ),
+        )
+        if genres:
+            pairs = [
+                (title, genre)
+                for title in titles
+                for genre in rnd.sample(genres, min(len(genres), 3))
+            ]
+            self.create(
+                models.TitleGenre,
+                len(pairs),
+                lambda pk, num: models.TitleGenre(
+                    pk=pk,
+                    title_id=pairs[num][0],
+                    genre_id=pairs[num][1],
+                ),
+            )
+        per_title = min(options['reviews'], len(users))
+        pairs = [
+            (title, author)
+            for title in titles
+            for author in rnd.sample(users, per_title)
+        ]
+        reviews = self.create(
+            models.Review,
+            len(pairs),
+            lambda pk, num: models.Review(
+                pk=pk,
+                title_id=pairs[num][0],
+                author_id=pairs[num][1],
+                text=f'Отзыв {pk}',
+                score=rnd.randint(1, 10),
+                pub_date=self.random_date(),
+            ),
+        )
+        per_review = options['comments']
+        self.create(
+            models.Comment,
+            len(reviews) * per_review,
+            lambda pk, num: models.Comment(
+                pk=pk,
+                review_id=reviews[num // per_review],
+                author_id=rnd.choice(users),
+                text=f'Комментарий {pk}',
+                pub_date=self.random_date(),
+            ),
+        )
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def random_date(self):
+        seconds = self.random.randint(0, self.options['days'] * 24 * 3600)
+        return self.now - timedelta(seconds=seconds)
+
+    def create(self, model, count, factory):
+        """Insert `count` rows built by `factory(pk, num)`, return ids."""
+        started = time.perf_counter()
+        start = self.next_pk(model)
+        pks = range(start, start + count)
+        # Keep generated publication dates instead of the insert time.
+        names = [field.name for field in model._meta.concrete_fields]
+        batches = iter(enumerate(pks))
+        while True:
+            batch = list(islice(batches, self.options['batch_size']))
+            if not batch:
+                break
+            bulk_create_keeping_dates(
+                model,
+                [factory(pk, num) for num, pk in batch],
+                names,
+            )
+        reset_sequence(model)
+        if not self.options['silent']:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {count} rows '
+                f'in {elapsed:.2f}s',
+            )
+        return list(pks)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate
+from reviews.models import Title
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds stored title ratings from reviews.
+
+    Usage:
+    ```
+    manage.py updateratings
+    ```
+    """
+
+    help = 'Rebuilds stored title ratings from reviews'
+
+    def handle(self, *args, **options):
+        updated = Title.objects.update_ratings()
+        invalidate('title')
+        self.stdout.write(f'Ratings of {updated} titles have been updated.')
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-17 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0002_title_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(
+                fields=['review', 'pub_date', 'id'],
+                name='comment_review_pub_date_id_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(
+                fields=['title', 'pub_date', 'id'],
+                name='review_title_pub_date_id_idx',
+            ),
+        ),
+    ]
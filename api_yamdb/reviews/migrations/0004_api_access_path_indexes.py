@@ -0,0 +1,36 @@
+# Generated by Django 4.2.5 on 2026-10-17 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0003_pub_date_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(
+                fields=['year', 'id'], name='title_year_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(
+                fields=['name', 'id'], name='title_name_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(
+                fields=['category', 'id'], name='title_category_id_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='titlegenre',
+            index=models.Index(
+                fields=['genre', 'title'], name='titlegenre_genre_title_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+from reviews.migrations import _search
+
+
+def install_search(apps, schema_editor):
+    _search.install(schema_editor)
+
+
+def uninstall_search(apps, schema_editor):
+    _search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0004_api_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.5 on 2026-10-17 11:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'subject',
+                    models.CharField(max_length=256, verbose_name='тема'),
+                ),
+                ('body', models.TextField(verbose_name='текст')),
+                (
+                    'to',
+                    models.EmailField(
+                        max_length=254, verbose_name='получатель'
+                    ),
+                ),
+                (
+                    'created',
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name='создано'
+                    ),
+                ),
+                (
+                    'send_after',
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name='отправить после',
+                    ),
+                ),
+                (
+                    'attempts',
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name='попытки'
+                    ),
+                ),
+                ('claim', models.UUIDField(editable=False, null=True)),
+                (
+                    'sent',
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name='отправлено'
+                    ),
+                ),
+                (
+                    'last_error',
+                    models.TextField(
+                        blank=True, verbose_name='последняя ошибка'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'исходящее письмо',
+                'verbose_name_plural': 'исходящие письма',
+                'ordering': ('id',),
+                'indexes': [
+                    models.Index(
+                        fields=['sent', 'send_after'],
+                        name='outbox_sent_send_after_idx',
+                    )
+                ],
+            },
+        ),
+    ]
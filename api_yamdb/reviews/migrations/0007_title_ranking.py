@@ -0,0 +1,56 @@
+# Generated by Django 4.2.5 on 2026-10-17 11:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0006_outbox_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleRanking',
+            fields=[
+                (
+                    'title',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='ranking',
+                        serialize=False,
+                        to='reviews.title',
+                    ),
+                ),
+                (
+                    'top_score',
+                    models.FloatField(verbose_name='взвешенный рейтинг'),
+                ),
+                (
+                    'trending_score',
+                    models.FloatField(verbose_name='популярность'),
+                ),
+                (
+                    'updated',
+                    models.DateTimeField(
+                        auto_now=True, verbose_name='обновлено'
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'место в рейтинге',
+                'verbose_name_plural': 'рейтинги',
+                'indexes': [
+                    models.Index(
+                        fields=['-top_score', '-title'],
+                        name='ranking_top_score_idx',
+                    ),
+                    models.Index(
+                        fields=['-trending_score', '-title'],
+                        name='ranking_trending_score_idx',
+                    ),
+                ],
+            },
+        ),
+    ]
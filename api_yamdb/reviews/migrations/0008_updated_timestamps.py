@@ -0,0 +1,39 @@
+# Generated by Django 4.2.5 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+from reviews.migrations import _search
+
+
+def install_title_search(apps, schema_editor):
+    # Adding or removing a column rebuilds the table on SQLite, which drops
+    # the triggers of its search index.
+    _search.install(schema_editor, ['reviews_title'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('reviews', '0007_title_ranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, install_title_search),
+        migrations.AddField(
+            model_name='comment',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='updated',
+            field=models.DateTimeField(
+                auto_now=True, verbose_name='обновлено'
+            ),
+        ),
+        migrations.RunPython(install_title_search, migrations.RunPython.noop),
+    ]
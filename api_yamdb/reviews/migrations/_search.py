@@ -0,0 +1,62 @@
+"""
+SQLite FTS5 indexes as created by migrations.
+
+This is a frozen copy of the DDL of `api.search`, so applying old
+migrations does not depend on the current search code or settings.
+Do not change existing statements, migrations that need a different
+index add their own helpers.
+"""
+
+# Indexed tables with their key and text columns.
+INDEXES = {
+    'reviews_title': ('id', ('name', 'description')),
+    'reviews_genre': ('id', ('name',)),
+    'reviews_category': ('id', ('name',)),
+    'reviews_user': ('id', ('username',)),
+}
+
+TRIGGERS = ('ai', 'ad', 'au')
+
+
+def get_install_sql(source, pk, columns):
+    table = f'{source}_fts'
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    delete = (
+        f'INSERT INTO {table}({table}, rowid, {names}) '
+        f"VALUES ('delete', old.{pk}, {old});"
+    )
+    insert = f'INSERT INTO {table}(rowid, {names}) VALUES (new.{pk}, {new});'
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+        f"{names}, content='{source}', content_rowid='{pk}', "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        *(f'DROP TRIGGER IF EXISTS {table}_{suffix}' for suffix in TRIGGERS),
+        f'CREATE TRIGGER {table}_ai AFTER INSERT ON {source} '
+        f'BEGIN {insert} END',
+        f'CREATE TRIGGER {table}_ad AFTER DELETE ON {source} '
+        f'BEGIN {delete} END',
+        f'CREATE TRIGGER {table}_au AFTER UPDATE OF {names} ON {source} '
+        f'BEGIN {delete} {insert} END',
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def install(schema_editor, sources=tuple(INDEXES)):
+    """Create the indexes of `sources` and their triggers, fill them."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for source in sources:
+        for sql in get_install_sql(source, *INDEXES[source]):
+            schema_editor.execute(sql)
+
+
+def uninstall(schema_editor, sources=tuple(INDEXES)):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for source in sources:
+        table = f'{source}_fts'
+        for suffix in TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
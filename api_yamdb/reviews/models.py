@@ -1,6 +1,14 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
 
 from api.validators import validate_username, validate_year
 
@@ -96,6 +104,39 @@ class Genre(NameSlugModel):
         verbose_name_plural = 'жанры'
 
 
+class TitleQuerySet(models.QuerySet):
+    def change_rating(self, score, count=0):
+        """Shift stored rating aggregates by the given score and count."""
+        return self.update(
+            rating_sum=F('rating_sum') + score,
+            rating_count=F('rating_count') + count,
+            updated=Now(),
+        )
+
+    def update_ratings(self):
+        """Recalculate stored rating aggregates from reviews."""
+        reviews = (
+            Review.objects.filter(title=OuterRef('pk'))
+            .order_by()
+            .values('title')
+        )
+        return self.update(
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum('score')).values('total')),
+                0,
+            ),
+            rating_count=Coalesce(
+                Subquery(reviews.annotate(total=Count('pk')).values('total')),
+                0,
+            ),
+            updated=Now(),
+        )
+
+    def touch(self):
+        """Mark titles changed, such as when their genres change."""
+        return self.update(updated=Now())
+
+
 class Title(models.Model):
     name = models.CharField('название', max_length=256)
     year = models.IntegerField('год', validators=(validate_year,))
@@ -108,20 +149,55 @@ class Title(models.Model):
         null=True,
     )
     genre = models.ManyToManyField(Genre, through='TitleGenre')
+    rating_sum = models.PositiveIntegerField(
+        'сумма оценок',
+        default=0,
+        editable=False,
+    )
+    rating_count = models.PositiveIntegerField(
+        'количество оценок',
+        default=0,
+        editable=False,
+    )
+    updated = models.DateTimeField('обновлено', auto_now=True)
+
+    objects = TitleQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'произведение'
         verbose_name_plural = 'произведения'
         ordering = ('id',)
+        indexes = [
+            models.Index(fields=('year', 'id'), name='title_year_id_idx'),
+            models.Index(fields=('name', 'id'), name='title_name_id_idx'),
+            models.Index(
+                fields=('category', 'id'),
+                name='title_category_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def rating(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
 
 class TitleGenre(models.Model):
     title = models.ForeignKey(Title, on_delete=models.CASCADE)
     genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('genre', 'title'),
+                name='titlegenre_genre_title_idx',
+            ),
+        ]
+
     def __str__(self):
         return f'{self.title} {self.genre}'
 
@@ -145,11 +221,18 @@ class Review(models.Model):
         ],
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'отзыв'
         verbose_name_plural = 'отзывы'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('title', 'pub_date', 'id'),
+                name='review_title_pub_date_id_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['title', 'author'],
@@ -174,11 +257,144 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('review', 'pub_date', 'id'),
+                name='comment_review_pub_date_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
+
+
+MEAN_RATING_KEY = 'ranking:mean'
+
+
+class TitleRankingQuerySet(models.QuerySet):
+    def refresh(self, title_ids=None):
+        """
+        Recalculate rankings of the given titles, or of every title.
+
+        `top_score` pulls the rating of titles with few reviews toward the
+        catalog mean, `trending_score` sums scores of recent reviews, each
+        halving every `RANKING_HALF_LIFE_DAYS`. Partial refreshes reuse
+        the catalog mean of the last full one.
+        """
+        now = timezone.now()
+        titles = Title.objects.filter(rating_count__gt=0)
+        reviews = Review.objects.filter(
+            pub_date__gte=now - timedelta(days=settings.RANKING_TRENDING_DAYS),
+        )
+        stale = self.all()
+        mean = None
+        if title_ids is not None:
+            titles = titles.filter(pk__in=title_ids)
+            reviews = reviews.filter(title_id__in=title_ids)
+            stale = stale.filter(title_id__in=title_ids)
+            mean = cache.get(MEAN_RATING_KEY)
+        if mean is None:
+            totals = Title.objects.aggregate(
+                total=Sum('rating_sum'),
+                count=Sum('rating_count'),
+            )
+            mean = totals['total'] / totals['count'] if totals['count'] else 0
+            cache.set(MEAN_RATING_KEY, mean, None)
+        half_life = timedelta(days=settings.RANKING_HALF_LIFE_DAYS)
+        trending = defaultdict(float)
+        for title_id, score, pub_date in reviews.values_list(
+            'title_id',
+            'score',
+            'pub_date',
+        ).iterator():
+            trending[title_id] += score * 0.5 ** ((now - pub_date) / half_life)
+        weight = settings.RANKING_MIN_REVIEWS
+        rankings = [
+            TitleRanking(
+                title_id=pk,
+                top_score=(total + weight * mean) / (count + weight),
+                trending_score=trending[pk],
+            )
+            for pk, total, count in titles.values_list(
+                'pk',
+                'rating_sum',
+                'rating_count',
+            ).iterator()
+        ]
+        # Upserts let concurrent refreshes of a title both succeed, rows
+        # are only deleted for titles that lost their last review.
+        with transaction.atomic():
+            stale.exclude(title__rating_count__gt=0).delete()
+            self.bulk_create(
+                rankings,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['title'],
+                update_fields=['top_score', 'trending_score', 'updated'],
+            )
+        return len(rankings)
+
+
+class TitleRanking(models.Model):
+    """Leaderboard scores of a reviewed title, see `refresh`."""
+
+    title = models.OneToOneField(
+        Title,
+        primary_key=True,
+        related_name='ranking',
+        on_delete=models.CASCADE,
+    )
+    top_score = models.FloatField('взвешенный рейтинг')
+    trending_score = models.FloatField('популярность')
+    updated = models.DateTimeField('обновлено', auto_now=True)
+
+    objects = TitleRankingQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'место в рейтинге'
+        verbose_name_plural = 'рейтинги'
+        indexes = [
+            models.Index(
+                fields=('-top_score', '-title'),
+                name='ranking_top_score_idx',
+            ),
+            models.Index(
+                fields=('-trending_score', '-title'),
+                name='ranking_trending_score_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.title_id}: {self.top_score:.2f}'
+
+
+class OutboxEmail(models.Model):
+    subject = models.CharField('тема', max_length=256)
+    body = models.TextField('текст')
+    to = models.EmailField('получатель', max_length=254)
+    created = models.DateTimeField('создано', auto_now_add=True)
+    send_after = models.DateTimeField('отправить после', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField('попытки', default=0)
+    claim = models.UUIDField(null=True, editable=False)
+    sent = models.DateTimeField('отправлено', null=True, blank=True)
+    last_error = models.TextField('последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'исходящее письмо'
+        verbose_name_plural = 'исходящие письма'
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=('sent', 'send_after'),
+                name='outbox_sent_send_after_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.to}: {self.subject}'